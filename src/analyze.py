@@ -0,0 +1,187 @@
+"""Batch analysis of EPD files on a pool of worker processes.
+
+    python3 -m src.analyze positions.epd --depth 6 --workers 8 > analysed.epd
+    python3 -m src.analyze positions.epd --movetime 0.5 -o analysed.epd
+
+Every record is searched and written back with its operations plus
+
+    bm    best move (SAN)       acd   depth of the last completed iteration
+    ce    score in centipawns   acn   nodes searched (main plus quiescence)
+    dm    moves to mate, when the side to move mates
+    pv    principal variation (SAN)
+
+The input is read as a stream and handed out in chunks, with at most a
+few chunks per worker in flight, so memory stays flat however many
+positions the file holds.  Workers keep one engine each and share
+nothing, so throughput grows with the number of cores.  Results come
+out in input order.  Records that cannot be read are reported on stderr
+and left out of the output.
+"""
+
+import argparse
+import multiprocessing
+import sys
+import time
+from collections import deque
+
+from src.chess_engine import ChessEngine, MATE_SCORE, MATE_BOUND
+from src.moves import move_name
+from src.notation import format_epd, move_to_san, parse_epd
+
+ANALYSIS_OPCODES = ('bm', 'ce', 'dm', 'acd', 'acn', 'pv')
+EPD_MATE = 32767  # ce of a mate delivered at the root, the usual EPD convention
+
+# Worker-process globals, set by _init_worker
+_engine = None
+_limits = None
+
+
+def _init_worker(hash_mb, depth, time_limit):
+    global _engine, _limits
+    _engine = ChessEngine(hash_mb)
+    _limits = depth, time_limit
+
+
+def analyze_record(engine, line, depth=None, time_limit=None):
+    """Search one EPD record with engine; return the analysed record.
+
+    Raises ValueError for a record that cannot be read.
+    """
+    position, operations = parse_epd(line)
+    engine.load_fen(position)
+    # The table is kept: search() ages it, so entries of earlier records are
+    # the first to be replaced, without reallocating it for every record
+    color = 'white' if engine.side == 0 else 'black'
+    result = engine.search(color, depth, time_limit, workers=1)
+    for opcode in ANALYSIS_OPCODES:
+        operations.pop(opcode, None)
+    if result is None:  # checkmate or stalemate: nothing to search
+        return format_epd(position, operations)
+
+    # Replay the PV to write it in SAN
+    line_san = []
+    for name in result.pv:
+        move = _legal_move(engine, name)
+        line_san.append(move_to_san(engine, move))
+        engine._make(move)
+    while engine.game_ply:
+        engine.undo_move()
+
+    operations['bm'] = line_san[0]
+    score = result.score
+    if abs(score) > MATE_BOUND:
+        plies = MATE_SCORE - abs(score)
+        operations['ce'] = EPD_MATE - plies if score > 0 else plies - EPD_MATE
+        if score > 0:
+            operations['dm'] = (plies + 1) // 2
+    else:
+        operations['ce'] = score
+    operations['acd'] = result.depth
+    operations['acn'] = result.nodes + result.qnodes
+    operations['pv'] = ' '.join(line_san)
+    return format_epd(position, operations)
+
+
+def _legal_move(engine, name):
+    # The packed legal move with squares name, e.g. ('e', 2, 'e', 4)
+    for move in engine._legal_moves(engine.side):
+        if move_name(move) == name:
+            return move
+    raise ValueError(f"Illegal move in principal variation: {name!r}")
+
+
+def _analyze_chunk(lines):
+    # Runs in a worker: [(record or None, error or None), ...] in input order
+    depth, time_limit = _limits
+    results = []
+    for line in lines:
+        try:
+            results.append((analyze_record(_engine, line, depth, time_limit), None))
+        except ValueError as error:
+            results.append((None, f"{error}"))
+    return results
+
+
+def analyze_stream(lines, depth=None, time_limit=None, workers=None, hash_mb=4,
+                   chunk_size=16, chunks_per_worker=4):
+    """Analyse EPD records from an iterable of lines.
+
+    Yields (record, error) pairs in input order: the analysed record, or
+    None and a message for a line that could not be read.  Blank lines are
+    skipped.  At most workers * chunks_per_worker chunks of chunk_size
+    lines are in flight at a time.
+    """
+    if depth is None and time_limit is None:
+        raise ValueError("analysis needs a depth or a time limit")
+    workers = workers or multiprocessing.cpu_count()
+    chunks = _chunks((line.strip() for line in lines if line.strip()), chunk_size)
+
+    if workers == 1:
+        _init_worker(hash_mb, depth, time_limit)
+        for chunk in chunks:
+            yield from _analyze_chunk(chunk)
+        return
+
+    context = multiprocessing.get_context()
+    with context.Pool(workers, initializer=_init_worker,
+                      initargs=(hash_mb, depth, time_limit)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= workers * chunks_per_worker:
+                yield from pending.popleft().get()
+            pending.append(pool.apply_async(_analyze_chunk, (chunk,)))
+        while pending:
+            yield from pending.popleft().get()
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse every position of an EPD file")
+    parser.add_argument("epd", help="EPD file to read ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="file to write (default stdout)")
+    parser.add_argument("--depth", type=int, help="search depth in plies")
+    parser.add_argument("--movetime", type=float, help="search time per position in seconds")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--hash", type=int, default=4, help="transposition table MB per worker (default 4)")
+    parser.add_argument("--chunk", type=int, default=16, help="positions per task (default 16)")
+    args = parser.parse_args(argv)
+    if args.depth is None and args.movetime is None:
+        parser.error("give --depth and/or --movetime")
+
+    source = sys.stdin if args.epd == '-' else open(args.epd, encoding='utf-8')
+    out = sys.stdout if args.output is None else open(args.output, 'w', encoding='utf-8')
+    start = time.time()
+    done = failed = 0
+    try:
+        for record, error in analyze_stream(source, args.depth, args.movetime, args.workers,
+                                            args.hash, args.chunk):
+            if error is not None:
+                failed += 1
+                print(f"skipped: {error}", file=sys.stderr)
+                continue
+            out.write(record + '\n')
+            done += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.time() - start
+    rate = done / elapsed if elapsed > 0 else 0
+    print(f"analysed {done} positions in {elapsed:.1f} s ({rate:.1f}/s), {failed} skipped",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
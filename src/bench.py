@@ -0,0 +1,79 @@
+"""Search benchmark: node counts and time per search configuration.
+
+    python3 -m src.bench                 # every configuration, depth 4
+    python3 -m src.bench --depth 5 --config plain --config selective
+    python3 -m src.bench --config selective --stats   # per-search statistics
+
+Each configuration searches every perft position (src.perft.POSITIONS) to
+the same fixed depth from an empty transposition table, so the totals
+compare how much work the configurations need for a search of that depth.
+"""
+
+import argparse
+import sys
+import time
+
+from src.chess_engine import ChessEngine
+from src.perft import POSITIONS
+from src.search_stats import SearchStats
+
+# Engine attributes set for each configuration
+CONFIGS = {
+    'plain':     {'null_move_pruning': False, 'late_move_reductions': False},
+    'null-move': {'null_move_pruning': True, 'late_move_reductions': False},
+    'lmr':       {'null_move_pruning': False, 'late_move_reductions': True},
+    'selective': {'null_move_pruning': True, 'late_move_reductions': True},
+}
+
+
+def run_bench(depth, configs=None, out=sys.stdout, stats=False):
+    """Search every position with each configuration.
+
+    With stats, each search's SearchStats summary is printed after it.
+    Returns {config: (nodes, qnodes, seconds)} totals.
+    """
+    totals = {}
+    for name in configs or CONFIGS:
+        nodes = qnodes = 0
+        elapsed = 0.0
+        for position, fen, _ in POSITIONS:
+            engine = ChessEngine(hash_mb=4)
+            for attribute, value in CONFIGS[name].items():
+                setattr(engine, attribute, value)
+            engine.load_fen(fen)
+            if stats:
+                engine.stats = SearchStats()
+            start = time.perf_counter()
+            move = engine.choose_best_move('white' if engine.side == 0 else 'black', depth)
+            seconds = time.perf_counter() - start
+            nodes += engine.nodes
+            qnodes += engine.qnodes
+            elapsed += seconds
+            print(f"{name:<10} {position:<18} {move[0]}{move[1]}{move[2]}{move[3]}  "
+                  f"{engine.nodes:>8} nodes  {engine.qnodes:>8} qnodes  {seconds:7.2f} s", file=out)
+            if stats:
+                print(engine.stats.summary(), file=out)
+        totals[name] = nodes, qnodes, elapsed
+    print(file=out)
+    base = next(iter(totals.values()))
+    for name, (nodes, qnodes, elapsed) in totals.items():
+        print(f"{name:<10} total {nodes:>9} nodes  {qnodes:>9} qnodes  {elapsed:7.2f} s  "
+              f"({(nodes + qnodes) / max(base[0] + base[1], 1):.0%} of the nodes, "
+              f"{elapsed / base[2] if base[2] else 0:.0%} of the time)", file=out)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare search configurations")
+    parser.add_argument("--depth", type=int, default=4, help="search depth in plies (default 4)")
+    parser.add_argument("--config", action='append', choices=list(CONFIGS),
+                        help="configuration to run (repeatable; default all)")
+    parser.add_argument("--stats", action='store_true',
+                        help="print search statistics after each search (slower)")
+    args = parser.parse_args(argv)
+    run_bench(args.depth, args.config, stats=args.stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
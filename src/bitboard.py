@@ -0,0 +1,171 @@
+# Bitboard helpers and precomputed attack tables used by ChessEngine.
+#
+# Squares are numbered 0..63 with a1 = 0, b1 = 1, ..., h8 = 63, which is the
+# same order as the flattened numpy board (square = row * 8 + col).  A
+# bitboard is a plain Python int whose bit n is set when square n is occupied.
+
+WHITE, BLACK = 0, 1
+FILES = 'abcdefgh'
+
+BIT = [1 << sq for sq in range(64)]
+
+# The c3-f6 block that earns the evaluation's central-control bonus
+CENTER = sum(BIT[y * 8 + x] for y in range(2, 6) for x in range(2, 6))
+
+# Ray directions as (file step, rank step).  The first four move towards
+# higher square numbers, so the nearest blocker on those rays is the lowest
+# set bit; on the last four it is the highest set bit.
+NORTH, NORTH_EAST, EAST, NORTH_WEST = 0, 1, 2, 3
+SOUTH, SOUTH_WEST, WEST, SOUTH_EAST = 4, 5, 6, 7
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (-1, 1),
+              (0, -1), (-1, -1), (-1, 0), (1, -1)]
+
+
+def square(x_idx, y_idx):
+    return y_idx * 8 + x_idx
+
+
+def square_name(sq):
+    return FILES[sq & 7], (sq >> 3) + 1
+
+
+def parse_square(x, y):
+    return (y - 1) * 8 + ord(x) - ord('a')
+
+
+if hasattr(int, 'bit_count'):
+    def popcount(bb):
+        return bb.bit_count()
+else:  # Python < 3.10
+    def popcount(bb):
+        return bin(bb).count('1')
+
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+def squares_of(bb):
+    """List the set squares of a bitboard in ascending order."""
+    result = []
+    while bb:
+        low = bb & -bb
+        result.append(low.bit_length() - 1)
+        bb ^= low
+    return result
+
+
+def _step_table(offsets):
+    table = []
+    for sq in range(64):
+        x, y = sq & 7, sq >> 3
+        bb = 0
+        for dx, dy in offsets:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < 8 and 0 <= ny < 8:
+                bb |= BIT[square(nx, ny)]
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table([(2, 1), (1, 2), (-1, 2), (-2, 1),
+                              (-2, -1), (-1, -2), (1, -2), (2, -1)])
+KING_ATTACKS = _step_table([(1, 0), (1, 1), (0, 1), (-1, 1),
+                            (-1, 0), (-1, -1), (0, -1), (1, -1)])
+# PAWN_ATTACKS[color][sq]: squares a pawn of that color on sq attacks
+PAWN_ATTACKS = [_step_table([(-1, 1), (1, 1)]), _step_table([(-1, -1), (1, -1)])]
+
+
+def _ray_table(dx, dy):
+    table = []
+    for sq in range(64):
+        x, y = sq & 7, sq >> 3
+        bb = 0
+        x, y = x + dx, y + dy
+        while 0 <= x < 8 and 0 <= y < 8:
+            bb |= BIT[square(x, y)]
+            x, y = x + dx, y + dy
+        table.append(bb)
+    return table
+
+
+RAYS = [_ray_table(dx, dy) for dx, dy in DIRECTIONS]
+
+
+def _line_tables():
+    # BETWEEN[a * 64 + b]: squares strictly between a and b when they share a
+    # rank, file or diagonal; LINE[a * 64 + b]: the whole line through both.
+    # Both are 0 for unaligned squares.
+    between = [0] * 4096
+    line = [0] * 4096
+    for a in range(64):
+        for d in range(8):
+            opposite = (d + 4) % 8
+            full = RAYS[d][a] | RAYS[opposite][a] | BIT[a]
+            for b in squares_of(RAYS[d][a]):
+                between[a * 64 + b] = RAYS[d][a] ^ RAYS[d][b] ^ BIT[b]
+                line[a * 64 + b] = full
+    return between, line
+
+
+BETWEEN, LINE = _line_tables()
+
+# Empty-board slider reach, used to skip ray scans that cannot hit anything
+ROOK_RAYS = [RAYS[NORTH][sq] | RAYS[EAST][sq] | RAYS[SOUTH][sq] | RAYS[WEST][sq] for sq in range(64)]
+BISHOP_RAYS = [RAYS[NORTH_EAST][sq] | RAYS[NORTH_WEST][sq] | RAYS[SOUTH_EAST][sq] | RAYS[SOUTH_WEST][sq]
+               for sq in range(64)]
+
+_N, _NE, _E, _NW = RAYS[NORTH], RAYS[NORTH_EAST], RAYS[EAST], RAYS[NORTH_WEST]
+_S, _SW, _W, _SE = RAYS[SOUTH], RAYS[SOUTH_WEST], RAYS[WEST], RAYS[SOUTH_EAST]
+
+
+def bishop_attacks(sq, occ):
+    """Diagonal attacks from sq given the occupancy bitboard occ."""
+    ray = _NE[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= _NE[(blockers & -blockers).bit_length() - 1]
+    attacks = ray
+    ray = _NW[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= _NW[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = _SE[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= _SE[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = _SW[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= _SW[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+def rook_attacks(sq, occ):
+    """Orthogonal attacks from sq given the occupancy bitboard occ."""
+    ray = _N[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= _N[(blockers & -blockers).bit_length() - 1]
+    attacks = ray
+    ray = _E[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= _E[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = _S[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= _S[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = _W[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= _W[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+def queen_attacks(sq, occ):
+    return bishop_attacks(sq, occ) | rook_attacks(sq, occ)
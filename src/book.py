@@ -0,0 +1,189 @@
+"""Opening book: weighted book moves keyed by Zobrist hash.
+
+The book is a binary file of fixed 12-byte records, sorted by key:
+
+    header   '<4sII'  magic b'PGBK', key check, record count
+    record   '<QHH'   position key, packed move, weight
+
+It is opened with mmap and searched by binary search, so opening a book
+reads nothing up front and a lookup touches a handful of pages.  The key
+check is taken from the Zobrist tables; a book built with different keys is
+refused rather than silently returning wrong moves.
+
+Build a book from a PGN file with
+
+    python3 -m src.book games.pgn book.bin --plies 16 --min-games 2
+
+and hand it to an engine with ``engine.book = OpeningBook('book.bin')``.
+"""
+
+import argparse
+import mmap
+import random
+import re
+import struct
+import sys
+
+from src.chess_engine import ChessEngine, START_FEN
+from src.notation import parse_san
+from src.zobrist import PIECE_KEYS
+
+HEADER = struct.Struct('<4sII')
+RECORD = struct.Struct('<QHH')
+MAGIC = b'PGBK'
+KEY_CHECK = PIECE_KEYS[1][0] & 0xFFFFFFFF
+
+assert HEADER.size == RECORD.size  # record i starts at (i + 1) * RECORD.size
+
+
+class OpeningBook:
+    """Read-only view of a book file (see the module docstring).
+
+    pick() chooses among a position's book moves at random in proportion to
+    their weights; pass seed for a repeatable sequence of choices.
+    """
+
+    def __init__(self, path, seed=None):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, key_check, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or key_check != KEY_CHECK:
+            self._map.close()
+            raise ValueError(f"{path} is not an opening book for these hash keys")
+        if len(self._map) < (self.count + 1) * RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path} is truncated")
+        self.random = random.Random(seed)
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self.count
+
+    def _key_at(self, index):
+        return struct.unpack_from('<Q', self._map, (index + 1) * RECORD.size)[0]
+
+    def probe(self, key):
+        """Return [(move, weight), ...] for the position with Zobrist key."""
+        lo, hi = 0, self.count
+        while lo < hi:  # first record with a key >= key
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        entries = []
+        while lo < self.count:
+            record_key, move, weight = RECORD.unpack_from(self._map, (lo + 1) * RECORD.size)
+            if record_key != key:
+                break
+            entries.append((move, weight))
+            lo += 1
+        return entries
+
+    def pick(self, key):
+        """A weighted random book move for key, or None if there is none."""
+        entries = self.probe(key)
+        total = sum(weight for _, weight in entries)
+        if not total:
+            return None
+        choice = self.random.randrange(total)
+        for move, weight in entries:
+            if choice < weight:
+                return move
+            choice -= weight
+        return None
+
+
+# ------------------------------------------------------------------ building
+
+_COMMENT = re.compile(r'\{[^}]*\}|;[^\n]*')
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+_RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+
+
+def read_games(text):
+    """Yield each game of PGN text as a list of SAN moves.
+
+    Tags, comments, recursive variations, NAGs and move numbers are
+    dropped; only the main line is returned.
+    """
+    movetext = []
+    for line in text.splitlines():
+        if line.startswith('['):
+            moves = _san_moves(' '.join(movetext))
+            if moves:
+                yield moves
+            movetext = []
+        else:
+            movetext.append(line)
+    moves = _san_moves(' '.join(movetext))
+    if moves:
+        yield moves
+
+
+def _san_moves(movetext):
+    movetext = _COMMENT.sub(' ', movetext)
+    moves = []
+    depth = 0  # nesting level of ( ... ) variations
+    for token in movetext.replace('(', ' ( ').replace(')', ' ) ').split():
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0 and token not in _RESULTS and not token.startswith('$'):
+            token = _MOVE_NUMBER.sub('', token)
+            if token:
+                moves.append(token)
+    return moves
+
+
+def build_book(pgn_text, path, max_plies=16, min_games=1):
+    """Compile the first max_plies moves of every game into a book file.
+
+    A move's weight is the number of games that played it in that position;
+    moves seen in fewer than min_games games are left out.  A game stops
+    contributing at its first move that cannot be read.  Returns the number
+    of records written.
+    """
+    engine = ChessEngine(hash_mb=1)
+    counts = {}
+    for moves in read_games(pgn_text):
+        engine.load_fen(START_FEN)
+        for san in moves[:max_plies]:
+            try:
+                move = parse_san(engine, san)
+            except ValueError:
+                break
+            entry = (engine.hash_key, move)
+            counts[entry] = counts.get(entry, 0) + 1
+            engine._make(move)
+
+    records = sorted((key, move, min(count, 0xFFFF))
+                     for (key, move), count in counts.items() if count >= min_games)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, KEY_CHECK, len(records)))
+        for record in records:
+            f.write(RECORD.pack(*record))
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile an opening book from a PGN file")
+    parser.add_argument("pgn", help="PGN file to read")
+    parser.add_argument("output", help="book file to write")
+    parser.add_argument("--plies", type=int, default=16, help="book depth in half-moves (default 16)")
+    parser.add_argument("--min-games", type=int, default=1,
+                        help="leave out moves played in fewer games (default 1)")
+    args = parser.parse_args(argv)
+
+    with open(args.pgn, encoding='utf-8', errors='replace') as f:
+        count = build_book(f.read(), args.output, args.plies, args.min_games)
+    print(f"wrote {count} book entries to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
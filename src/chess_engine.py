@@ -1,17 +1,249 @@
+import os
+import time
+
 import numpy as np
 
+from src.bitboard import (
+    WHITE, BLACK, BIT, CENTER,
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_RAYS, BISHOP_RAYS, BETWEEN, LINE,
+    bishop_attacks, rook_attacks, queen_attacks, popcount,
+    square_name, parse_square, squares_of,
+)
+from src.move_ordering import MoveOrderer, MAX_PLY
+from src.moves import (
+    CASTLING, EN_PASSANT, PROMOTION, FLAG_MASK, QUEEN_PROMOTION,
+    ALL_CASTLING, WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE, CASTLING_MASK,
+    encode_move, move_name,
+)
+from src.search_stats import WRAPPED_METHODS
+from src.transposition import TranspositionTable, EXACT, LOWER, UPPER
+from src.zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS
+
 # python -m venv venv
 # source venv/bin/activate
 
+PIECE_VALUES = {1: 100, 2: 320, 3: 330, 4: 500, 5: 900, 6: 20000}
+CENTER_BONUS = 10
+MAX_DEPTH = 64  # iterative-deepening ceiling when only a time limit is given
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Mate scores count down with the ply the mate is delivered at, so shorter
+# mates score higher; anything beyond MATE_BOUND is a mate score
+MATE_SCORE = 1000000
+MATE_BOUND = MATE_SCORE - 1000
+
+# Quiescence search skips captures that could not lift the score to alpha
+# even if the captured material came for free plus this much
+DELTA_MARGIN = 200
+
+# Null-move pruning: the side to move passes and is searched this much
+# shallower; if it still fails high the real moves surely would
+NULL_MOVE_REDUCTION = 2
+# Late-move reductions: quiet moves after the first LMR_FULL_MOVES are
+# searched one ply shallower at nodes with at least LMR_MIN_DEPTH to go
+LMR_FULL_MOVES = 3
+LMR_MIN_DEPTH = 3
+# Aspiration windows: from this depth on, the root is searched within
+# ASPIRATION_WINDOW of the previous iteration's score first
+ASPIRATION_WINDOW = 50
+ASPIRATION_MIN_DEPTH = 3
+
+
+def _piece_square_values():
+    # PIECE_SQUARE_VALUES[piece][sq]: material plus the central-control bonus,
+    # signed from White's point of view (indexed like ChessEngine.bitboards)
+    table = [[0] * 64 for _ in range(13)]
+    for kind, value in PIECE_VALUES.items():
+        for sq in range(64):
+            score = value + (CENTER_BONUS if CENTER & BIT[sq] else 0)
+            table[kind][sq] = score
+            table[-kind][sq] = -score
+    return table
+
+
+PIECE_SQUARE_VALUES = _piece_square_values()
+# The same table flattened for numpy: entry (piece + 6) * 64 + sq
+PIECE_SQUARE_ARRAY = np.array([PIECE_SQUARE_VALUES[piece][sq] for piece in range(-6, 7) for sq in range(64)],
+                              dtype=np.int64)
+_SQUARE_INDEX = np.arange(64)
+
+
+def evaluate_boards(boards):
+    """Score a stack of positions at once.
+
+    boards is an (N, 8, 8) integer array in ChessEngine.board layout; the
+    result is an array of N scores equal to what evaluate_board would give
+    for each one.  The work is a single np.take over the flattened
+    piece-square table plus a sum, with no Python loop over squares.
+    """
+    flat = np.asarray(boards).reshape(-1, 64)
+    return np.take(PIECE_SQUARE_ARRAY, (flat + 6) * 64 + _SQUARE_INDEX).sum(axis=1)
+
+
+def _score_to_tt(score, ply):
+    # Mate scores are stored relative to the node rather than the root
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when it runs out of time."""
+
+
+class SearchResult:
+    """What ChessEngine.search found.
+
+    move is the best move and pv the principal variation starting with it,
+    as ('e', 2, 'e', 4) tuples; score is in centipawns for the side that
+    searched (beyond MATE_BOUND: a forced mate); depth is the last completed
+    iteration, 0 for book and tablebase moves.
+    """
+
+    __slots__ = ('move', 'score', 'depth', 'pv', 'nodes', 'qnodes')
+
+    def __init__(self, move, score, depth, pv, nodes=0, qnodes=0):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.qnodes = qnodes
+
+    def __repr__(self):
+        return (f"SearchResult(move={self.move!r}, score={self.score}, depth={self.depth}, "
+                f"pv={self.pv!r}, nodes={self.nodes}, qnodes={self.qnodes})")
+
+
+class BoardArray(np.ndarray):
+    """8x8 numpy view of a ChessEngine position.
+
+    The engine keeps the position in bitboards and rebuilds this array from
+    them when it is asked for.  Writing into the array (``engine.board[1, 3]
+    = 0``, or ``engine.board[1][3] = 0`` through a row) loads the edited
+    position back into the engine, so positions set up by hand keep working.
+    Once the engine's position changes the array is detached: it keeps the
+    old squares and writing into it no longer touches the engine.
+    """
+
+    def __array_finalize__(self, obj):
+        self.engine = None
+        # Rows and other slices write through to the full board they share
+        # memory with; copies are on their own
+        top = getattr(obj, '_top', None)
+        self._top = top if top is not None and np.may_share_memory(self, top) else None
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        top = self._top
+        if top is not None and top.engine is not None:
+            top.engine._load_squares(np.asarray(top).reshape(64).tolist(), view=top)
+
+
+class UndoRecord:
+    """What _make overwrites and undo_move restores, for one move."""
+
+    __slots__ = ('move', 'piece', 'captured', 'ep_square', 'castling', 'side', 'key', 'score', 'halfmove')
+
+
+class PositionInfo:
+    """Legal moves and check flags of one position (by hash key), per side.
+
+    Each entry is worked out the first time it is asked for; None means
+    not yet.
+    """
+
+    __slots__ = ('key', 'moves', 'check')
+
+    def __init__(self, key):
+        self.key = key
+        self.moves = [None, None]
+        self.check = [None, None]
+
+
 class ChessEngine:
-    def __init__(self):
+    def __init__(self, hash_mb=16):
+        self.castling = ALL_CASTLING  # WHITE_KINGSIDE | WHITE_QUEENSIDE | ...
+        # Undo stack: records are allocated once and reused; game_ply is the
+        # number of moves made so far.  _undo[i].key is the hash key of the
+        # position at game ply i, so the stack is also the key history that
+        # repetitions are found in.
+        self._undo = [UndoRecord() for _ in range(256)]
+        self.game_ply = 0
+        self.halfmove = 0  # plies since the last capture or pawn move (fifty-move rule)
+        self._start_ply = 0  # game ply of the starting position, for FEN move numbers
+        self.ep_square = None
+        self.side = WHITE  # side to move
         self.board = self.initalize_board()
-        self.white_king_moved = False
-        self.black_king_moved = False
-        self.white_rooks_moved = [False, False]  # [queenside, kingside]
-        self.black_rooks_moved = [False, False]  # [queenside, kingside]
-        self.move_history = []
-        self.en_passant_target = None
+        # Transposition table shared by minimax and choose_best_move; its
+        # size is fixed in MB so long sessions stay bounded
+        self.tt = TranspositionTable(hash_mb)
+        # Search bookkeeping (see choose_best_move)
+        self.nodes = 0
+        self.qnodes = 0  # quiescence-search nodes, counted apart from nodes
+        self._deadline = None
+        self._stop = None  # cancel token checked with the deadline
+        self._root_ply = 0
+        self._pv = []
+        self._follow_pv = False
+        # _pv_table[ply]: best line found from ply on, built up by negamax
+        self._pv_table = [[] for _ in range(MAX_PLY + 1)]
+        self.orderer = MoveOrderer()
+        # Resolve captures at the horizon instead of evaluating mid-exchange
+        self.quiescence = True
+        # Selective search: prune after a null move, reduce late quiet moves
+        self.null_move_pruning = True
+        self.late_move_reductions = True
+        # Without quiescence, score the children of depth-1 nodes with one
+        # evaluate_boards call; the search is the same as without it (with
+        # quiescence the horizon searches captures, which cannot be batched)
+        self.batch_frontier = False
+        # Worker processes for choose_best_move (1 searches in this process)
+        self.workers = 1
+        # Opening book (src.book.OpeningBook) consulted before searching
+        self.book = None
+        # Endgame tablebases (src.tablebase.Tablebases) probed by the search
+        self.tablebases = None
+        # Search statistics (src.search_stats.SearchStats) filled in by each
+        # search; None costs nothing
+        self.stats = None
+        # Legal moves and check flags of the last position asked about through
+        # the public query methods; a new hash key makes it stale, so make and
+        # undo never need to touch it
+        self._position_info = None
+        # Only take transposition cutoffs from entries of exactly the needed
+        # depth, so scores do not depend on what was searched before
+        self._tt_same_depth = False
+
+    def __getstate__(self):
+        # Copies (e.g. for worker processes) carry the position and settings
+        # but not the transposition table or move-ordering statistics
+        state = self.__dict__.copy()
+        del state['tt'], state['orderer']
+        state['_board_view'] = None
+        state['book'] = None  # memory-mapped; reopen it in the copy if needed
+        state['_stop'] = None
+        state['stats'] = None
+        state['_position_info'] = None
+        for name in WRAPPED_METHODS:  # counting wrappers of an attached SearchStats
+            state.pop(name, None)
+        state['_undo'] = self._undo[:self.game_ply]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tt = TranspositionTable(1)
+        self.orderer = MoveOrderer()
 
     def initalize_board(self):
         # Initalize 8x8 chess board
@@ -27,10 +259,159 @@ class ChessEngine:
         # Set up other pieces
         pieces = [4, 2, 3, 5, 6, 3, 2, 4]
         board[0, :] = pieces # White pieces
-        board[7, :] = [-p for p in pieces] # Black pieces 
+        board[7, :] = [-p for p in pieces] # Black pieces
 
         return board
-    
+
+    # ------------------------------------------------------------------ position storage
+
+    @property
+    def board(self):
+        # The bitboards are the real position; the numpy board is a cached view
+        if self._board_view is None:
+            view = np.array(self.squares, dtype=int).reshape(8, 8).view(BoardArray)
+            view.engine = self
+            view._top = view
+            self._board_view = view
+        return self._board_view
+
+    @board.setter
+    def board(self, array):
+        self._load_squares(np.asarray(array, dtype=int).reshape(64).tolist())
+
+    def _load_squares(self, squares, view=None):
+        # squares: 64 piece codes, index = row * 8 + col (a1 = 0)
+        self.squares = squares
+        # bitboards[piece] for piece in -6..6; negative codes wrap around to
+        # the end of the 13-slot list, so bitboards[-6] is the black king
+        self.bitboards = [0] * 13
+        self.occupancy = [0, 0]  # [white, black]
+        for sq, piece in enumerate(squares):
+            if piece:
+                self.bitboards[piece] |= BIT[sq]
+                self.occupancy[WHITE if piece > 0 else BLACK] |= BIT[sq]
+        self.occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        # King squares are tracked by make/undo so check tests never search for them
+        self.king_squares = [
+            self.bitboards[6].bit_length() - 1 if self.bitboards[6] else None,
+            self.bitboards[-6].bit_length() - 1 if self.bitboards[-6] else None,
+        ]
+        old = self.__dict__.get('_board_view')
+        if old is not None and old is not view:
+            old.engine = None
+        self._board_view = view
+        self.hash_key = self._compute_hash()
+        # Running evaluation, updated by make/undo (see evaluate_board)
+        self.eval_score = sum(PIECE_SQUARE_VALUES[piece][sq] for sq, piece in enumerate(squares) if piece)
+
+    @property
+    def move_history(self):
+        # Moves made so far, oldest first, as ('e', 2, 'e', 4) tuples
+        return [move_name(record.move) for record in self._undo[:self.game_ply]]
+
+    @property
+    def en_passant_target(self):
+        # Square a pawn may capture onto en passant, as ('d', 6), or None
+        return None if self.ep_square is None else square_name(self.ep_square)
+
+    @en_passant_target.setter
+    def en_passant_target(self, target):
+        if self.ep_square is not None:
+            self.hash_key ^= EN_PASSANT_KEYS[self.ep_square & 7]
+        self.ep_square = None if target is None else parse_square(*target)
+        if self.ep_square is not None:
+            self.hash_key ^= EN_PASSANT_KEYS[self.ep_square & 7]
+
+    # ------------------------------------------------------------------ hashing
+
+    def _compute_hash(self):
+        # Full Zobrist key from scratch; make/undo keep hash_key up to date incrementally
+        key = 0
+        for sq, piece in enumerate(self.squares):
+            if piece:
+                key ^= PIECE_KEYS[piece][sq]
+        if self.side == BLACK:
+            key ^= SIDE_KEY
+        key ^= CASTLING_KEYS[self.castling]
+        if self.ep_square is not None:
+            key ^= EN_PASSANT_KEYS[self.ep_square & 7]
+        return key
+
+    def load_fen(self, fen):
+        """Set up the position described by a FEN string.
+
+        The halfmove and fullmove counters are optional.  Positions before
+        this one are unknown, so repetitions are counted from here on.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        placement, active, castling, en_passant = fields[:4]
+        symbols = {'p': 1, 'n': 2, 'b': 3, 'r': 4, 'q': 5, 'k': 6}
+        squares = [0] * 64
+        ranks = placement.split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN placement: {placement!r}")
+        for i, rank in enumerate(ranks):
+            x = 0
+            for char in rank:
+                if char.isdigit():
+                    x += int(char)
+                elif char.lower() in symbols and x < 8:
+                    value = symbols[char.lower()]
+                    squares[(7 - i) * 8 + x] = value if char.isupper() else -value
+                    x += 1
+                else:
+                    raise ValueError(f"Invalid FEN placement: {placement!r}")
+            if x != 8:
+                raise ValueError(f"Invalid FEN placement: {placement!r}")
+        if active not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN side to move: {active!r}")
+        halfmove = fields[4] if len(fields) > 4 else '0'
+        fullmove = fields[5] if len(fields) > 5 else '1'
+        if not halfmove.isdigit() or not fullmove.isdigit():
+            raise ValueError(f"Invalid FEN move counters: {halfmove!r} {fullmove!r}")
+        if en_passant != '-' and (len(en_passant) != 2 or en_passant[0] not in 'abcdefgh'
+                                  or en_passant[1] not in '36'):
+            raise ValueError(f"Invalid FEN en passant square: {en_passant!r}")
+
+        self.castling = 0
+        for char, right in (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                            ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE)):
+            if char in castling:
+                self.castling |= right
+        self.ep_square = None if en_passant == '-' else parse_square(en_passant[0], int(en_passant[1]))
+        self.side = WHITE if active == 'w' else BLACK
+        self.game_ply = 0
+        self.halfmove = int(halfmove)
+        self._start_ply = 2 * (max(int(fullmove), 1) - 1) + self.side
+        self._load_squares(squares)
+
+    def to_fen(self):
+        """FEN string of the current position.
+
+        The move number counts on from the one the position was loaded with.
+        """
+        letters = ' PNBRQK'
+        rows = []
+        for row in range(7, -1, -1):
+            text, empty = '', 0
+            for piece in self.squares[row * 8:row * 8 + 8]:
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += letters[piece] if piece > 0 else letters[-piece].lower()
+            rows.append(text + (str(empty) if empty else ''))
+        castling = ''.join(char for char, right in (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                                                    ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+                           if self.castling & right) or '-'
+        en_passant = '-' if self.ep_square is None else '%s%d' % square_name(self.ep_square)
+        fullmove = (self._start_ply + self.game_ply) // 2 + 1
+        return f"{'/'.join(rows)} {'wb'[self.side]} {castling} {en_passant} {self.halfmove} {fullmove}"
+
     def print_board(self):
         # Display current board state
         piece_symbols = {
@@ -44,59 +425,237 @@ class ChessEngine:
         }
         print('  a b c d e f g h')
         for y in range(7, -1, -1):
-            print(f"{y+1} {' '.join(piece_symbols[self.board[y, x]] for x in range(8))} {y+1}")
+            print(f"{y+1} {' '.join(piece_symbols[self.squares[y*8 + x]] for x in range(8))} {y+1}")
         print('  a b c d e f g h')
 
     def is_valid_position(self, x, y):
         return 'a' <= x <= 'h' and 1 <= y <= 8
 
-    def get_pawn_moves(self, x, y, color):
-        moves = []
-        x_idx = ord(x) - ord('a')
-        y_idx = y - 1
-        direction = 1 if color == 'white' else -1
-        
-        # Move forward
-        if self.is_valid_position(x, y + direction) and self.board[y_idx + direction, x_idx] == 0:
-            moves.append((x, y + direction))
-            
-            # Double move from starting position
-            if (color == 'white' and y == 2) or (color == 'black' and y == 7):
-                if self.board[y_idx + 2*direction, x_idx] == 0:
-                    moves.append((x, y + 2*direction))
-        
-        # Capture diagonally
-        for dx in [-1, 1]:
-            new_x = chr(ord(x) + dx)
-            if self.is_valid_position(new_x, y + direction):
-                if color == 'white' and self.board[y_idx + direction, x_idx + dx] < 0:
-                    moves.append((new_x, y + direction))
-                elif color == 'black' and self.board[y_idx + direction, x_idx + dx] > 0:
-                    moves.append((new_x, y + direction))
-
-        # En passant
-        if self.en_passant_target:
-            en_passant_x, en_passant_y = self.en_passant_target
-            if abs(ord(x) - ord(en_passant_x)) == 1 and ((color == 'white' and y == 5) or (color == 'black' and y == 4)):
-                moves.append((en_passant_x, en_passant_y))
+    # ------------------------------------------------------------------ move generation (bitboards)
 
-        return moves
-    
-    def get_knight_moves(self, x, y):
+    def _pawn_targets(self, sq, side):
+        occ = self.occupied
+        rank = sq >> 3
+        targets = PAWN_ATTACKS[side][sq] & self.occupancy[side ^ 1]
+        if side == WHITE:
+            if rank < 7 and not occ & BIT[sq + 8]:
+                targets |= BIT[sq + 8]
+                if rank == 1 and not occ & BIT[sq + 16]:
+                    targets |= BIT[sq + 16]
+        else:
+            if rank > 0 and not occ & BIT[sq - 8]:
+                targets |= BIT[sq - 8]
+                if rank == 6 and not occ & BIT[sq - 16]:
+                    targets |= BIT[sq - 16]
+        if self.ep_square is not None:
+            targets |= PAWN_ATTACKS[side][sq] & BIT[self.ep_square]
+        return targets
+
+    def _own_pieces(self, sq):
+        piece = self.squares[sq]
+        if piece == 0:
+            return 0
+        return self.occupancy[WHITE if piece > 0 else BLACK]
+
+    def _targets(self, sq):
+        # Pseudo-legal destinations of the piece on sq, castling excluded
+        piece = self.squares[sq]
+        kind = piece if piece > 0 else -piece
+        if kind == 1:
+            return self._pawn_targets(sq, WHITE if piece > 0 else BLACK)
+        own = self.occupancy[WHITE if piece > 0 else BLACK]
+        if kind == 2:
+            return KNIGHT_ATTACKS[sq] & ~own
+        if kind == 3:
+            return bishop_attacks(sq, self.occupied) & ~own
+        if kind == 4:
+            return rook_attacks(sq, self.occupied) & ~own
+        if kind == 5:
+            return queen_attacks(sq, self.occupied) & ~own
+        if kind == 6:
+            return KING_ATTACKS[sq] & ~own
+        return 0
+
+    def _attacked(self, sq, by_side):
+        # Look outward from sq: a piece of by_side attacks sq exactly when the
+        # same piece standing on sq would attack it (pawns use the other color)
+        bbs = self.bitboards
+        if by_side == WHITE:
+            if KNIGHT_ATTACKS[sq] & bbs[2] or PAWN_ATTACKS[BLACK][sq] & bbs[1] or KING_ATTACKS[sq] & bbs[6]:
+                return True
+            rooks = bbs[4] | bbs[5]
+            bishops = bbs[3] | bbs[5]
+        else:
+            if KNIGHT_ATTACKS[sq] & bbs[-2] or PAWN_ATTACKS[WHITE][sq] & bbs[-1] or KING_ATTACKS[sq] & bbs[-6]:
+                return True
+            rooks = bbs[-4] | bbs[-5]
+            bishops = bbs[-3] | bbs[-5]
+        if ROOK_RAYS[sq] & rooks and rook_attacks(sq, self.occupied) & rooks:
+            return True
+        return bool(BISHOP_RAYS[sq] & bishops and bishop_attacks(sq, self.occupied) & bishops)
+
+    def _attackers(self, sq, by_side, occ):
+        # Bitboard of by_side's pieces attacking sq with occupancy occ
+        bbs = self.bitboards
+        sign = 1 if by_side == WHITE else -1
+        queens = bbs[5 * sign]
+        return ((KNIGHT_ATTACKS[sq] & bbs[2 * sign])
+                | (PAWN_ATTACKS[by_side ^ 1][sq] & bbs[sign])
+                | (KING_ATTACKS[sq] & bbs[6 * sign])
+                | (rook_attacks(sq, occ) & (bbs[4 * sign] | queens))
+                | (bishop_attacks(sq, occ) & (bbs[3 * sign] | queens)))
+
+    def _in_check(self, side):
+        king_sq = self.king_squares[side]
+        return king_sq is not None and self._attacked(king_sq, side ^ 1)
+
+    def _can_castle(self, side, kingside):
+        right = WHITE_KINGSIDE if kingside else WHITE_QUEENSIDE
+        if not self.castling & right << 2 * side:
+            return False
+        row = 0 if side == WHITE else 56
+        # Squares between king and rook must be empty; the king's square and
+        # the two it passes through must not be attacked
+        if kingside:
+            empty, safe = BIT[row + 5] | BIT[row + 6], BIT[row + 4] | BIT[row + 5] | BIT[row + 6]
+        else:
+            empty = BIT[row + 1] | BIT[row + 2] | BIT[row + 3]
+            safe = BIT[row + 2] | BIT[row + 3] | BIT[row + 4]
+        if self.occupied & empty:
+            return False
+        enemy = side ^ 1
+        for sq in squares_of(safe):
+            if self._attacked(sq, enemy):
+                return False
+        return True
+
+    def _pseudo_moves(self, side):
         moves = []
-        knight_moves = [
-            (2, 1), (1, 2), (-1, 2), (-2, 1),
-            (-2, -1), (-1, -2), (1, -2), (2, -1)
-        ]
-        for dx, dy in knight_moves:
-            new_x = chr(ord(x) + dx)
-            new_y = y + dy
-            if self.is_valid_position(new_x, new_y):
-                x_idx, y_idx = ord(new_x) - ord('a'), new_y - 1
-                if self.board[y_idx, x_idx] * self.board[y - 1, ord(x) - ord('a')] <= 0:  # Empty or opponent's piece
-                    moves.append((new_x, new_y))
+        for sq in squares_of(self.occupancy[side]):
+            targets = self._targets(sq)
+            while targets:
+                low = targets & -targets
+                moves.append(self._encode(sq, low.bit_length() - 1))
+                targets ^= low
+        king_sq = self.king_squares[side]
+        if king_sq is not None:
+            row = 0 if side == WHITE else 56
+            if self._can_castle(side, True):
+                moves.append(encode_move(king_sq, row + 6, CASTLING))
+            if self._can_castle(side, False):
+                moves.append(encode_move(king_sq, row + 2, CASTLING))
         return moves
 
+    def _encode(self, frm, to):
+        # Packed move for a from/to pair in this position, flags included
+        piece = self.squares[frm]
+        if piece == 6 or piece == -6:
+            if to - frm == 2 or frm - to == 2:
+                return encode_move(frm, to, CASTLING)
+        elif piece == 1 or piece == -1:
+            if to >= 56 or to < 8:
+                return encode_move(frm, to, QUEEN_PROMOTION)  # auto-queen
+            if (frm ^ to) & 7 and not self.squares[to]:
+                return encode_move(frm, to, EN_PASSANT)
+        return frm | to << 6
+
+    def _legal_moves(self, side, captures_only=False):
+        # Pins and check evasions are worked out once for the position, so
+        # most moves are legal by construction.  King moves (castling
+        # included) and en passant are still verified by making them.
+        # captures_only keeps captures and promotions and skips quiet moves
+        # (and castling) entirely, for the quiescence search.
+        king_sq = self.king_squares[side]
+        if king_sq is None:
+            return self._pseudo_moves(side)
+        bbs = self.bitboards
+        occ = self.occupied
+        own = self.occupancy[side]
+        enemy = side ^ 1
+        sign = -1 if side == WHITE else 1  # enemy piece sign
+
+        # Non-king moves must land in evasion_mask: anywhere when not in check,
+        # on the checker or between it and the king in single check, nowhere
+        # in double check
+        checkers = self._attackers(king_sq, enemy, occ)
+        if not checkers:
+            evasion_mask = -1
+        elif checkers & (checkers - 1):
+            evasion_mask = 0
+        else:
+            evasion_mask = checkers | BETWEEN[king_sq * 64 + checkers.bit_length() - 1]
+        capture_mask = self.occupancy[enemy] if captures_only else -1
+
+        # A piece alone between the king and an enemy slider may only move along that line
+        pin_lines = {}
+        queens = bbs[5 * sign]
+        snipers = ((ROOK_RAYS[king_sq] & (bbs[4 * sign] | queens))
+                   | (BISHOP_RAYS[king_sq] & (bbs[3 * sign] | queens)))
+        while snipers:
+            low = snipers & -snipers
+            snipers ^= low
+            line_index = king_sq * 64 + low.bit_length() - 1
+            blockers = BETWEEN[line_index] & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pin_lines[blockers.bit_length() - 1] = LINE[line_index]
+
+        ep_bit = BIT[self.ep_square] if self.ep_square is not None else 0
+        squares = self.squares
+        legal = []
+        tricky = []
+        # Pawns on this rank promote with their next move
+        promotion_rank = 0xFF << 48 if side == WHITE else 0xFF << 8
+        for sq in squares_of(own):
+            if sq == king_sq:
+                targets = self._targets(sq) & capture_mask
+                while targets:
+                    low = targets & -targets
+                    tricky.append(sq | (low.bit_length() - 1) << 6)
+                    targets ^= low
+                continue
+            targets = self._targets(sq)
+            base = sq
+            mask = evasion_mask & capture_mask
+            if squares[sq] == 1 or squares[sq] == -1:
+                if ep_bit & targets:
+                    targets ^= ep_bit
+                    tricky.append(encode_move(sq, self.ep_square, EN_PASSANT))
+                if BIT[sq] & promotion_rank:
+                    base |= QUEEN_PROMOTION
+                    mask = evasion_mask  # pushes promote too
+            targets &= mask
+            if sq in pin_lines:
+                targets &= pin_lines[sq]
+            while targets:
+                low = targets & -targets
+                legal.append(base | (low.bit_length() - 1) << 6)
+                targets ^= low
+
+        if not checkers and not captures_only:
+            row = 0 if side == WHITE else 56
+            if self._can_castle(side, True):
+                tricky.append(encode_move(king_sq, row + 6, CASTLING))
+            if self._can_castle(side, False):
+                tricky.append(encode_move(king_sq, row + 2, CASTLING))
+        for move in tricky:
+            self._make(move)
+            if not self._in_check(side):
+                legal.append(move)
+            self.undo_move()
+        return legal
+
+    # ------------------------------------------------------------------ public move API (algebraic squares)
+
+    def _target_names(self, targets):
+        return [square_name(sq) for sq in squares_of(targets)]
+
+    def get_pawn_moves(self, x, y, color):
+        return self._target_names(self._pawn_targets(parse_square(x, y), WHITE if color == 'white' else BLACK))
+
+    def get_knight_moves(self, x, y):
+        sq = parse_square(x, y)
+        return self._target_names(KNIGHT_ATTACKS[sq] & ~self._own_pieces(sq))
+
     def get_bishop_moves(self, x, y):
         return self.get_diagonal_moves(x, y)
 
@@ -107,126 +666,32 @@ class ChessEngine:
         return self.get_diagonal_moves(x, y) + self.get_straight_moves(x, y)
 
     def get_diagonal_moves(self, x, y):
-        moves = []
-        directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-        for dx, dy in directions:
-            for i in range(1, 8):
-                new_x = chr(ord(x) + i*dx)
-                new_y = y + i*dy
-                if not self.is_valid_position(new_x, new_y):
-                    break
-                x_idx, y_idx = ord(new_x) - ord('a'), new_y - 1
-                if self.board[y_idx, x_idx] == 0:
-                    moves.append((new_x, new_y))
-                elif self.board[y_idx, x_idx] * self.board[y - 1, ord(x) - ord('a')] < 0:  # Opponent's piece
-                    moves.append((new_x, new_y))
-                    break
-                else:
-                    break
-        return moves
+        sq = parse_square(x, y)
+        return self._target_names(bishop_attacks(sq, self.occupied) & ~self._own_pieces(sq))
 
     def get_straight_moves(self, x, y):
-        moves = []
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-        for dx, dy in directions:
-            for i in range(1, 8):
-                new_x = chr(ord(x) + i*dx)
-                new_y = y + i*dy
-                if not self.is_valid_position(new_x, new_y):
-                    break
-                x_idx, y_idx = ord(new_x) - ord('a'), new_y - 1
-                if self.board[y_idx, x_idx] == 0:
-                    moves.append((new_x, new_y))
-                elif self.board[y_idx, x_idx] * self.board[y - 1, ord(x) - ord('a')] < 0:  # Opponent's piece
-                    moves.append((new_x, new_y))
-                    break
-                else:
-                    break
-        return moves
+        sq = parse_square(x, y)
+        return self._target_names(rook_attacks(sq, self.occupied) & ~self._own_pieces(sq))
 
     def get_basic_king_moves(self, x, y):
-        moves = []
-        king_moves = [
-            (1, 0), (1, 1), (0, 1), (-1, 1),
-            (-1, 0), (-1, -1), (0, -1), (1, -1)
-        ]
-        for dx, dy in king_moves:
-            new_x = chr(ord(x) + dx)
-            new_y = y + dy
-            if self.is_valid_position(new_x, new_y):
-                x_idx, y_idx = ord(new_x) - ord('a'), new_y - 1
-                if self.board[y_idx, x_idx] * self.board[y - 1, ord(x) - ord('a')] <= 0:  # Empty or opponent's piece
-                    moves.append((new_x, new_y))
-        return moves
-    
-    def is_square_attacked(self, x, y, attacking_color):
-        for i in range(8):
-            for j in range(8):
-                piece = self.board[i, j]
-                if (piece > 0 and attacking_color == 'white') or (piece < 0 and attacking_color == 'black'):
-                    moves = self.get_basic_moves(chr(ord('a') + j), i + 1)
-                    if (x, y) in moves:
-                        return True
-        return False
-    
-    def can_castle(self, color, side):
-        y = 1 if color == 'white' else 8
-        king_x = 'e'
-        
-        # Check if king or rook has moved
-        if color == 'white':
-            if self.white_king_moved or self.white_rooks_moved[0 if side == 'queenside' else 1]:
-                return False
-        else:
-            if self.black_king_moved or self.black_rooks_moved[0 if side == 'queenside' else 1]:
-                return False
-
-        # Check if squares between king and rook are empty
-        if side == 'queenside':
-            empty_squares = ['d', 'c', 'b']
-            rook_x = 'a'
-        else:  # kingside
-            empty_squares = ['f', 'g']
-            rook_x = 'h'
+        sq = parse_square(x, y)
+        return self._target_names(KING_ATTACKS[sq] & ~self._own_pieces(sq))
 
-        for x in empty_squares:
-            if self.board[y-1, ord(x)-ord('a')] != 0:
-                return False
+    def is_square_attacked(self, x, y, attacking_color):
+        side = WHITE if attacking_color == 'white' else BLACK
+        return self._attacked(parse_square(x, y), side)
 
-        # Check if king is in check or passes through attacked squares
-        enemy_color = 'black' if color == 'white' else 'white'
-        check_squares = [king_x] + empty_squares[:2]  # King's current square and the two it passes through
-        for x in check_squares:
-            if self.is_square_attacked(x, y, enemy_color):
-                return False
+    def can_castle(self, color, side):
+        return self._can_castle(WHITE if color == 'white' else BLACK, side == 'kingside')
 
-        return True
-    
     def get_basic_moves(self, x, y):
-        x_idx = ord(x) - ord('a')
-        y_idx = y - 1
-        piece = self.board[y_idx, x_idx]
-        color = 'white' if piece > 0 else 'black'
-        
-        if abs(piece) == 1:  # Pawn
-            return self.get_pawn_moves(x, y, color)
-        elif abs(piece) == 2:  # Knight
-            return self.get_knight_moves(x, y)
-        elif abs(piece) == 3:  # Bishop
-            return self.get_bishop_moves(x, y)
-        elif abs(piece) == 4:  # Rook
-            return self.get_rook_moves(x, y)
-        elif abs(piece) == 5:  # Queen
-            return self.get_queen_moves(x, y)
-        elif abs(piece) == 6:  # King
-            return self.get_basic_king_moves(x, y)
-        else:
-            return []
-        
+        return self._target_names(self._targets(parse_square(x, y)))
+
     def get_moves(self, x, y):
         moves = self.get_basic_moves(x, y)
-        if abs(self.board[y-1, ord(x)-ord('a')]) == 6:  # If it's a king
-            color = 'white' if self.board[y-1, ord(x)-ord('a')] > 0 else 'black'
+        piece = self.squares[parse_square(x, y)]
+        if abs(piece) == 6:  # If it's a king
+            color = 'white' if piece > 0 else 'black'
             # Check castling
             if self.can_castle(color, 'kingside'):
                 moves.append(('g', y))
@@ -235,221 +700,717 @@ class ChessEngine:
         return moves
 
     def make_move(self, from_x, from_y, to_x, to_y):
-        piece = self.board[from_y-1, ord(from_x)-ord('a')]
-        captured_piece = self.board[to_y-1, ord(to_x)-ord('a')]
-        color = 'white' if piece > 0 else 'black'
-
-        # Record full state needed to undo: original piece + all castling flags
-        self.move_history.append((
-            from_x, from_y, to_x, to_y, piece, captured_piece,
-            self.en_passant_target,
-            self.white_king_moved, self.black_king_moved,
-            list(self.white_rooks_moved), list(self.black_rooks_moved)
-        ))
+        self._make(self._encode(parse_square(from_x, from_y), parse_square(to_x, to_y)))
+
+    def _make(self, move):
+        frm = move & 63
+        to = move >> 6 & 63
+        squares = self.squares
+        bbs = self.bitboards
+        occupancy = self.occupancy
+        piece = squares[frm]
+        captured = squares[to]
+        kind = piece if piece > 0 else -piece
+        side = WHITE if piece > 0 else BLACK
+        key = self.hash_key
+        score = self.eval_score
+
+        # Fill the next undo record in place
+        ply = self.game_ply
+        if ply == len(self._undo):
+            self._undo.append(UndoRecord())
+        record = self._undo[ply]
+        record.move = move
+        record.piece = piece
+        record.captured = captured
+        record.ep_square = self.ep_square
+        record.castling = self.castling
+        record.side = self.side
+        record.key = key
+        record.score = score
+        record.halfmove = self.halfmove
+        self.game_ply = ply + 1
+        self.halfmove = 0 if kind == 1 or captured else self.halfmove + 1
+        if self.ep_square is not None:
+            key ^= EN_PASSANT_KEYS[self.ep_square & 7]
 
         # Move the piece
-        self.board[to_y-1, ord(to_x)-ord('a')] = piece
-        self.board[from_y-1, ord(from_x)-ord('a')] = 0
+        from_bit, to_bit = BIT[frm], BIT[to]
+        if captured:
+            bbs[captured] ^= to_bit
+            occupancy[WHITE if captured > 0 else BLACK] ^= to_bit
+            key ^= PIECE_KEYS[captured][to]
+            score -= PIECE_SQUARE_VALUES[captured][to]
+        key ^= PIECE_KEYS[piece][frm] ^ PIECE_KEYS[piece][to]
+        score += PIECE_SQUARE_VALUES[piece][to] - PIECE_SQUARE_VALUES[piece][frm]
+        bbs[piece] ^= from_bit | to_bit
+        occupancy[side] ^= from_bit | to_bit
+        squares[frm] = 0
+        squares[to] = piece
+        if kind == 6:
+            self.king_squares[side] = to
 
-        # Update flags and handle special moves
-        if abs(piece) == 6:  # King
-            if piece > 0:
-                self.white_king_moved = True
-            else:
-                self.black_king_moved = True
-            # Castling: slide the rook inline (no recursive make_move)
-            if abs(ord(to_x) - ord(from_x)) == 2:
-                if to_x == 'g':  # Kingside
-                    rook_from_col, rook_to_col = ord('h') - ord('a'), ord('f') - ord('a')
-                else:  # Queenside
-                    rook_from_col, rook_to_col = ord('a') - ord('a'), ord('d') - ord('a')
-                rook = self.board[from_y-1, rook_from_col]
-                self.board[from_y-1, rook_to_col] = rook
-                self.board[from_y-1, rook_from_col] = 0
-
-        elif abs(piece) == 4:  # Rook moved — forfeit castling right on that side
-            if from_x == 'a':
-                if piece > 0: self.white_rooks_moved[0] = True
-                else: self.black_rooks_moved[0] = True
-            elif from_x == 'h':
-                if piece > 0: self.white_rooks_moved[1] = True
-                else: self.black_rooks_moved[1] = True
-
-        # Pawn promotion (auto-queen)
-        if abs(piece) == 1 and (to_y == 8 or to_y == 1):
-            self.board[to_y-1, ord(to_x)-ord('a')] = 5 if piece > 0 else -5
-
-        # En passant state update
-        if abs(piece) == 1 and abs(from_y - to_y) == 2:
-            # Double push — set target square for opponent
-            self.en_passant_target = (to_x, (from_y + to_y) // 2)
-        elif abs(piece) == 1 and to_x != from_x and captured_piece == 0:
-            # En passant capture — remove the bypassed pawn
-            captured_pawn_y = to_y - 1 if color == 'white' else to_y + 1
-            self.board[captured_pawn_y-1, ord(to_x)-ord('a')] = 0
-            self.en_passant_target = None
+        flag = move & FLAG_MASK
+        if flag == CASTLING:
+            # Slide the rook inline (no recursive make_move)
+            row = frm & ~7
+            if to & 7 == 6:  # Kingside
+                rook_from, rook_to = row + 7, row + 5
+            else:  # Queenside
+                rook_from, rook_to = row, row + 3
+            rook = self._shift(rook_from, rook_to)
+            if rook:
+                key ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+                score += PIECE_SQUARE_VALUES[rook][rook_to] - PIECE_SQUARE_VALUES[rook][rook_from]
+        elif flag == EN_PASSANT:
+            # Remove the bypassed pawn
+            captured_sq = to - 8 if side == WHITE else to + 8
+            pawn = squares[captured_sq]
+            if pawn:
+                bbs[pawn] ^= BIT[captured_sq]
+                occupancy[side ^ 1] &= ~BIT[captured_sq]
+                squares[captured_sq] = 0
+                key ^= PIECE_KEYS[pawn][captured_sq]
+                score -= PIECE_SQUARE_VALUES[pawn][captured_sq]
+        elif flag == PROMOTION:
+            promoted = (move >> 14) + 2
+            if piece < 0:
+                promoted = -promoted
+            bbs[piece] ^= to_bit
+            bbs[promoted] |= to_bit
+            squares[to] = promoted
+            key ^= PIECE_KEYS[piece][to] ^ PIECE_KEYS[promoted][to]
+            score += PIECE_SQUARE_VALUES[promoted][to] - PIECE_SQUARE_VALUES[piece][to]
+
+        # Moving the king or a rook, or capturing a rook, forfeits castling
+        rights = self.castling
+        if rights:
+            new_rights = rights & CASTLING_MASK[frm] & CASTLING_MASK[to]
+            if new_rights != rights:
+                key ^= CASTLING_KEYS[rights] ^ CASTLING_KEYS[new_rights]
+                self.castling = new_rights
+
+        # A double push gives the opponent an en passant target
+        if kind == 1 and (to - frm == 16 or frm - to == 16):
+            self.ep_square = (frm + to) // 2
+            key ^= EN_PASSANT_KEYS[to & 7]
         else:
-            self.en_passant_target = None
+            self.ep_square = None
+
+        # The opponent of the piece just moved is now to move
+        if self.side == side:
+            key ^= SIDE_KEY
+        self.side = side ^ 1
+
+        self.hash_key = key
+        self.eval_score = score
+        self.occupied = occupancy[WHITE] | occupancy[BLACK]
+        if self._board_view is not None:
+            self._board_view.engine = None  # the old position must not be written back
+            self._board_view = None
+
+    def _shift(self, frm, to):
+        # Move whatever stands on frm to the empty square to (castling rook
+        # slides); returns the piece moved, 0 if there was none
+        piece = self.squares[frm]
+        if piece:
+            self.bitboards[piece] ^= BIT[frm] | BIT[to]
+            self.occupancy[WHITE if piece > 0 else BLACK] ^= BIT[frm] | BIT[to]
+            self.squares[frm] = 0
+            self.squares[to] = piece
+        return piece
 
-    
     def evaluate_board(self):
         # Function to evaluate board state.
         # To be used by minmax algo to assess pos.
-        if self.is_checkmate('white'):
-            return -float('inf')
-        if self.is_checkmate('black'):
-            return float('inf')
-        
-        value = 0
-        piece_values = {1: 100, 2: 320, 3: 330, 4: 500, 5: 900, 6: 20000}
-        
-        for y in range(8):
-            for x in range(8):
-                piece = self.board[y, x]
-                if piece != 0:
-                    # Add or subtract piece value
-                    value += piece_values[abs(piece)] * (1 if piece > 0 else -1)
-                    
-                    # Bonus for central control (simplified)
-                    if 2 <= x <= 5 and 2 <= y <= 5:
-                        value += 10 * (1 if piece > 0 else -1)
-        
-        return value
-    
+        # Material plus a central-control bonus (PIECE_SQUARE_VALUES), kept as
+        # a running total by make/undo.  Mate and stalemate are scored by the
+        # search when a side has no legal moves.
+        return self.eval_score
+
+    def _position(self):
+        # PositionInfo for the current position, reused while the key matches
+        info = self._position_info
+        if info is None or info.key != self.hash_key:
+            info = self._position_info = PositionInfo(self.hash_key)
+        return info
+
+    def _cached_moves(self, side):
+        info = self._position()
+        moves = info.moves[side]
+        if moves is None:
+            moves = info.moves[side] = self._legal_moves(side)
+        return moves
+
+    def _cached_check(self, side):
+        info = self._position()
+        check = info.check[side]
+        if check is None:
+            check = info.check[side] = self._in_check(side)
+        return check
+
     def is_checkmate(self, color):
-        if not self.is_in_check(color):
-            return False
+        side = WHITE if color == 'white' else BLACK
         # Checkmate if in check and no legal move exists
-        return len(self.get_all_moves(color)) == 0
+        return self._cached_check(side) and not self._cached_moves(side)
 
     def is_in_check(self, color):
-        # Find the king
-        king_pos = None
-        king_value = 6 if color == 'white' else -6
-        for y in range(8):
-            for x in range(8):
-                if self.board[y, x] == king_value:
-                    king_pos = (x, y)
-                    break
-            if king_pos:
-                break
-        
-        if not king_pos:
-            return False  # This shouldn't happen in a valid game state
-        
-        # Check if any opponent's piece can attack the king
-        opponent_color = 'black' if color == 'white' else 'white'
-        for y in range(8):
-            for x in range(8):
-                piece = self.board[y, x]
-                if (piece < 0 and opponent_color == 'black') or (piece > 0 and opponent_color == 'white'):
-                    moves = self.get_basic_moves(chr(ord('a') + x), y + 1)
-                    if (chr(ord('a') + king_pos[0]), king_pos[1] + 1) in moves:
-                        return True
-        
-        return False
-    
+        return self._cached_check(WHITE if color == 'white' else BLACK)
+
+    def game_status(self, color):
+        """How the game stands with color to move.
+
+        'checkmate', 'stalemate', 'threefold repetition', 'fifty-move rule',
+        or None while it goes on.
+        """
+        side = WHITE if color == 'white' else BLACK
+        if not self._cached_moves(side):
+            return 'checkmate' if self._cached_check(side) else 'stalemate'
+        return self.is_draw()
+
     def minimax(self, depth, alpha, beta, maximizing_player):
-        if depth == 0:
-            return self.evaluate_board()
-        
+        # The search from White's point of view (maximizing_player: White is
+        # to move), kept for callers of the original interface
         if maximizing_player:
-            max_eval = -float('inf')
-            for move in self.get_all_moves('white'):
-                self.make_move(*move)
-                eval = self.minimax(depth - 1, alpha, beta, False)
+            return self.negamax(depth, alpha, beta)
+        return -self.negamax(depth, -beta, -alpha)
+
+    def negamax(self, depth, alpha, beta):
+        # Principal variation search.  Scores are for the side to move, and
+        # so are the transposition-table entries, with a bound type relative
+        # to the (alpha, beta) window.  The first move at a node gets the full
+        # window; the rest get a zero window that only asks whether they beat
+        # alpha, and are searched again with the full window if they do.
+        if depth <= 0 and self.quiescence:
+            return self._quiesce(alpha, beta)
+        self.nodes += 1
+        if not self.nodes & 1023 and self._search_expired():
+            raise SearchTimeout
+        side = self.side
+        ply = min(max(self.game_ply - self._root_ply, 0), MAX_PLY - 1)
+        pv_node = beta - alpha > 1
+        self._pv_table[ply] = []
+        if ply and self.halfmove >= 4 and self._repetitions():
+            return 0  # draw: a repeated position
+        if ply and self.halfmove >= 100 and (not self._in_check(side) or self._legal_moves(side)):
+            return 0  # draw by the fifty-move rule, unless the hundredth ply mated
+        tablebases = self.tablebases
+        if tablebases is not None and popcount(self.occupied) <= tablebases.max_pieces:
+            value = tablebases.probe(self)
+            if value is not None:
+                return tablebases.score(value, ply)
+        key = self.hash_key
+        hash_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            entry_depth, bound, score, hash_move = entry
+            # No cutoffs on the principal variation, so its line stays complete
+            if not pv_node and (entry_depth == depth or entry_depth > depth and not self._tt_same_depth):
+                score = _score_from_tt(score, ply)
+                if bound == EXACT:
+                    return score
+                if bound == LOWER and score >= beta:
+                    return score
+                if bound == UPPER and score <= alpha:
+                    return score
+
+        if depth <= 0:
+            # Static evaluation, unless the side to move is in check with no
+            # way out: mates on the horizon still count as mates
+            if self._in_check(side) and not self._legal_moves(side):
+                value = -(MATE_SCORE - ply)
+                self.tt.store(key, 0, EXACT, _score_to_tt(value, ply), 0)
+                return value
+            value = self.evaluate_board() if side == WHITE else -self.evaluate_board()
+            self.tt.store(key, 0, EXACT, value, 0)
+            return value
+
+        in_check = self._in_check(side)
+        if (self.null_move_pruning and not pv_node and depth > NULL_MOVE_REDUCTION and not in_check
+                and self._null_move_allowed(side)):
+            # Pass: if the opponent still cannot get back inside the window
+            # with a free move, searching the real moves would not either
+            static = self.evaluate_board() if side == WHITE else -self.evaluate_board()
+            if static >= beta:
+                self._make_null()
+                value = -self.negamax(depth - 1 - NULL_MOVE_REDUCTION, -beta, 1 - beta)
                 self.undo_move()
-                max_eval = max(max_eval, eval)
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-            return max_eval
-        else:
-            min_eval = float('inf')
-            for move in self.get_all_moves('black'):
-                self.make_move(*move)
-                eval = self.minimax(depth - 1, alpha, beta, True)
+                if value >= beta:
+                    return beta
+
+        legal_moves = self._legal_moves(side)
+        if not legal_moves:
+            # Checkmate (scored by distance from the root) or stalemate
+            value = -(MATE_SCORE - ply) if in_check else 0
+            self.tt.store(key, depth, EXACT, _score_to_tt(value, ply), 0)
+            return value
+
+        pv_move = None
+        if self._follow_pv:
+            # Still on the previous iteration's principal variation: try its move first
+            if ply < len(self._pv):
+                pv_move = self._pv[ply]
+            else:
+                self._follow_pv = False
+        moves = self.orderer.order(legal_moves, self.squares, ply, side, hash_move, pv_move)
+        alpha_orig = alpha
+        squares = self.squares
+        # Moves from index `late` on may be reduced (when quiet and not checking)
+        late = (LMR_FULL_MOVES if self.late_move_reductions and depth >= LMR_MIN_DEPTH and not in_check
+                else len(moves))
+
+        frontier = None
+        if depth == 1 and self.batch_frontier and not self.quiescence:
+            frontier = self._score_children(moves)
+        best_eval, best_move = -float('inf'), None
+        for index, move in enumerate(moves):
+            if frontier is not None and frontier[index] is not None:
+                # Scored in the batch: what negamax(0) returns for the child
+                child_key, eval = frontier[index]
+                self.nodes += 1
+                self.tt.store(child_key, 0, EXACT, -eval, 0)
+            else:
+                reduce = index >= late and not squares[move >> 6 & 63] and not move & FLAG_MASK
+                self._make(move)
+                if index == 0:
+                    eval = -self.negamax(depth - 1, -beta, -alpha)
+                else:
+                    if reduce and not self._in_check(side ^ 1):
+                        eval = -self.negamax(depth - 2, -alpha - 1, -alpha)
+                    else:
+                        eval = alpha + 1  # no reduction: go straight to the zero-window search
+                    if eval > alpha:
+                        eval = -self.negamax(depth - 1, -alpha - 1, -alpha)
+                        if alpha < eval < beta:  # fail high inside a PV node: find the exact score
+                            eval = -self.negamax(depth - 1, -beta, -alpha)
                 self.undo_move()
-                min_eval = min(min_eval, eval)
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-            return min_eval
+            self._follow_pv = False
+            if eval > best_eval:
+                best_eval, best_move = eval, move
+                if eval > alpha:
+                    alpha = eval
+                    if pv_node:
+                        self._pv_table[ply] = [move] + self._pv_table[ply + 1] if depth > 1 else [move]
+                    if alpha >= beta:
+                        self.orderer.record_cutoff(move, squares, ply, side, depth, index == 0)
+                        break
+
+        if best_eval <= alpha_orig:
+            bound = UPPER
+        elif best_eval >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, bound, _score_to_tt(best_eval, ply), best_move)
+        return best_eval
+
+    def _repetitions(self):
+        # Earlier occurrences of the current position.  Only the plies since
+        # the last capture or pawn move can repeat it, and only every other
+        # one has the same side to move.
+        key = self.hash_key
+        undo = self._undo
+        ply = self.game_ply
+        oldest = max(ply - self.halfmove, 0)
+        return sum(1 for i in range(ply - 4, oldest - 1, -2) if undo[i].key == key)
+
+    def is_draw(self):
+        """'threefold repetition' or 'fifty-move rule' when the game is drawn by rule, else None."""
+        if self.halfmove >= 4 and self._repetitions() >= 2:
+            return 'threefold repetition'
+        if self.halfmove >= 100:
+            return 'fifty-move rule'
+        return None
+
+    def _null_move_allowed(self, side):
+        # Not twice in a row, and not when only pawns are left: in pawn
+        # endings passing is often the only losing option (zugzwang)
+        if self.game_ply and not self._undo[self.game_ply - 1].move:
+            return False
+        bbs = self.bitboards
+        pawns_and_king = bbs[1] | bbs[6] if side == WHITE else bbs[-1] | bbs[-6]
+        return bool(self.occupancy[side] & ~pawns_and_king)
+
+    def _make_null(self):
+        # Hand the move to the opponent without moving; undo_move takes it back
+        ply = self.game_ply
+        if ply == len(self._undo):
+            self._undo.append(UndoRecord())
+        record = self._undo[ply]
+        record.move = 0
+        record.ep_square = self.ep_square
+        record.side = self.side
+        record.key = self.hash_key
+        record.halfmove = self.halfmove
+        self.game_ply = ply + 1
+        self.halfmove = 0  # repetition scans stop at the null move
+        if self.ep_square is not None:
+            self.hash_key ^= EN_PASSANT_KEYS[self.ep_square & 7]
+            self.ep_square = None
+        self.hash_key ^= SIDE_KEY
+        self.side ^= 1
+
+    def _quiesce(self, alpha, beta):
+        # Search captures and promotions only, until the position is quiet.
+        # The side to move may "stand pat" on the static evaluation instead
+        # of capturing, except in check, where every evasion is searched.
+        self.qnodes += 1
+        if not self.qnodes & 1023 and self._search_expired():
+            raise SearchTimeout
+        side = self.side
+        ply = min(max(self.game_ply - self._root_ply, 0), MAX_PLY - 1)
+        if self._in_check(side):
+            moves = self._legal_moves(side)
+            if not moves:
+                return -(MATE_SCORE - ply)
+            stand_pat = None
+            best_eval = -float('inf')
+        else:
+            stand_pat = self.evaluate_board() if side == WHITE else -self.evaluate_board()
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            moves = self._legal_moves(side, captures_only=True)
+            best_eval = stand_pat
+
+        squares = self.squares
+        for move in self.orderer.order(moves, squares, ply, side):
+            if stand_pat is not None:
+                # Delta pruning: skip captures that cannot reach the window
+                victim = squares[move >> 6 & 63]
+                gain = PIECE_VALUES[victim if victim > 0 else -victim] if victim else 0
+                flag = move & FLAG_MASK
+                if flag == PROMOTION:
+                    gain += PIECE_VALUES[5] - PIECE_VALUES[1]
+                elif flag == EN_PASSANT:
+                    gain = PIECE_VALUES[1]
+                if stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+            self._make(move)
+            eval = -self._quiesce(-beta, -alpha)
+            self.undo_move()
+            if eval > best_eval:
+                best_eval = eval
+                if eval > alpha:
+                    alpha = eval
+                    if alpha >= beta:
+                        break
+        return best_eval
+
+    def _score_children(self, moves):
+        # Frontier node: the children's static scores, for the side to move,
+        # from one evaluate_boards call.  negamax walks the moves as usual and
+        # takes a child's (key, score) from here instead of searching it; a
+        # child that negamax(0) might score differently is None and searched:
+        # one in check (it may be mated), a draw by rule, a tablebase
+        # position or one with a transposition-table entry.
+        tablebases = self.tablebases
+        boards, indexes, keys = [], [], []
+        for index, move in enumerate(moves):
+            self._make(move)
+            if not (self._in_check(self.side)
+                    or self.halfmove >= 100 or self.halfmove >= 4 and self._repetitions()
+                    or tablebases is not None and popcount(self.occupied) <= tablebases.max_pieces
+                    or self.tt.probe(self.hash_key) is not None):
+                boards.append(list(self.squares))
+                indexes.append(index)
+                keys.append(self.hash_key)
+            self.undo_move()
+        scores = [None] * len(moves)
+        if boards:
+            sign = 1 if self.side == WHITE else -1
+            for index, key, score in zip(indexes, keys, (evaluate_boards(np.array(boards)) * sign).tolist()):
+                scores[index] = key, score
+        return scores
+
+    def perft(self, depth):
+        """Count the leaf nodes of the legal move tree depth plies deep."""
+        moves = self._legal_moves(self.side)
+        if depth <= 1:
+            return len(moves) if depth == 1 else 1
+        nodes = 0
+        for move in moves:
+            self._make(move)
+            nodes += self.perft(depth - 1)
+            self.undo_move()
+        return nodes
+
+    def divide(self, depth):
+        """Perft split by root move: {('e', 2, 'e', 4): nodes, ...}."""
+        result = {}
+        for move in self._legal_moves(self.side):
+            self._make(move)
+            result[move_name(move)] = self.perft(depth - 1)
+            self.undo_move()
+        return result
 
     def get_legal_moves(self, x, y):
-        """Filters get_moves to only moves that don't leave own king in check."""
-        piece = self.board[y-1, ord(x)-ord('a')]
+        """Target squares of the legal moves of the piece on (x, y), as ('e', 4)."""
+        frm = parse_square(x, y)
+        piece = self.squares[frm]
         if piece == 0:
             return []
-        color = 'white' if piece > 0 else 'black'
-        legal = []
-        for move in self.get_moves(x, y):
-            self.make_move(x, y, move[0], move[1])
-            if not self.is_in_check(color):
-                legal.append(move)
-            self.undo_move()
-        return legal
+        return [square_name(move >> 6 & 63)
+                for move in self._cached_moves(WHITE if piece > 0 else BLACK) if move & 63 == frm]
 
     def get_all_moves(self, color):
-        moves = []
-        for y in range(8):
-            for x in range(8):
-                piece = self.board[y, x]
-                if (piece > 0 and color == 'white') or (piece < 0 and color == 'black'):
-                    sq_x = chr(ord('a') + x)
-                    for move in self.get_legal_moves(sq_x, y + 1):
-                        moves.append((sq_x, y + 1, move[0], move[1]))
-        return moves
+        side = WHITE if color == 'white' else BLACK
+        return [move_name(move) for move in self._cached_moves(side)]
+
+    def _search_expired(self):
+        # Polled by the search every 1024 nodes
+        return (self._deadline is not None and time.time() > self._deadline
+                or self._stop is not None and self._stop.is_set())
+
+    def choose_best_move(self, color, depth=None, time_limit=None, workers=None, stop=None):
+        """Pick a move for color by iterative deepening.
+
+        Takes the same arguments as search() and returns just the move, as
+        ('e', 2, 'e', 4), or None when color has no legal move.
+        """
+        result = self.search(color, depth, time_limit, workers, stop)
+        return None if result is None else result.move
+
+    def search(self, color, depth=None, time_limit=None, workers=None, stop=None, report=None):
+        """Search the position for color by iterative deepening.
+
+        Searches depth 1, 2, 3, ... up to depth plies.  With time_limit
+        (seconds) the search stops when the budget runs out and the result
+        of the last completed iteration is returned; depth then only caps how
+        deep it may go.  Each iteration searches the previous one's principal
+        variation first, within an aspiration window around its score.
+
+        With workers > 1 (default self.workers, capped at the number of
+        cores) each iteration's root moves are split across that many
+        processes (see src.parallel); at a fixed depth without a time limit
+        the chosen move is the same from run to run.
 
-    def choose_best_move(self, color, depth):
-        best_move = None
-        best_eval = -float('inf') if color == 'white' else float('inf')
-        
-        for move in self.get_all_moves(color):
-            self.make_move(*move)
-            eval = self.minimax(depth - 1, -float('inf'), float('inf'), color == 'black')
+        When self.book has a move for the position it is played without
+        searching, and so is the table move when self.tablebases covers it.
+
+        stop is an optional cancel token (a threading.Event): once it is set
+        the search ends within a few milliseconds and returns the result of
+        the last completed iteration.
+
+        report, if given, is called with the SearchResult of each completed
+        iteration as the search goes.
+
+        Returns a SearchResult, or None if color has no legal move (or the
+        search was stopped before its first iteration completed).
+        """
+        if depth is None and time_limit is None:
+            raise ValueError("search needs a depth or a time_limit")
+        if workers is None:
+            workers = self.workers
+        workers = min(workers, os.cpu_count() or 1)  # more processes than cores only add overhead
+        side = WHITE if color == 'white' else BLACK
+        if self.side != side:  # searching for color declares it the side to move
+            self.side = side
+            self.hash_key ^= SIDE_KEY
+
+        if self.book is not None:
+            move = self.book.pick(self.hash_key)
+            if move and move in self._legal_moves(side):  # guards against key collisions
+                return SearchResult(move_name(move), 0, 0, [move_name(move)])
+        tablebases = self.tablebases
+        if tablebases is not None and popcount(self.occupied) <= tablebases.max_pieces:
+            move = tablebases.best_move(self)
+            if move:
+                score = tablebases.score(tablebases.probe(self), 0)
+                return SearchResult(move_name(move), score, 0, [move_name(move)])
+
+        start = time.time()
+        self.tt.new_search()
+        self.orderer.new_search()
+        self.nodes = 0
+        self.qnodes = 0
+        self._root_ply = self.game_ply
+        self._pv = []
+        self._stop = stop
+        result = None
+        stats = self.stats
+        if stats is not None:
+            stats.attach(self)
+
+        try:
+            for current_depth in range(1, (depth or MAX_DEPTH) + 1):
+                # The first iteration always completes so there is a move to return
+                if time_limit is not None and result is not None:
+                    self._deadline = start + time_limit
+                try:
+                    if workers > 1:
+                        self._follow_pv = False
+                        move, score, pv = self._search_root_parallel(
+                            side, current_depth, workers, time_limit is None,
+                            None if result is None else result.score)
+                    else:
+                        move, score, pv = self._search_aspiration(current_depth,
+                                                                  None if result is None else result.score)
+                except SearchTimeout:
+                    while self.game_ply > self._root_ply:
+                        self.undo_move()
+                    break
+                finally:
+                    self._deadline = None
+                if move is None:  # no legal moves
+                    break
+                self._pv = pv
+                result = SearchResult(move_name(move), score, current_depth, [move_name(m) for m in pv],
+                                      self.nodes, self.qnodes)
+                if stats is not None:
+                    stats.end_iteration(self)
+                if report is not None:
+                    report(result)
+                if abs(score) > MATE_BOUND:  # forced mate found
+                    break
+                # The next iteration would take several times longer than this one
+                if time_limit is not None and time.time() - start > time_limit / 2:
+                    break
+        finally:  # also when the search raises: the engine's own methods come back
+            self._stop = None
+            if stats is not None:
+                stats.detach(self)
+        if result is not None:
+            result.nodes, result.qnodes = self.nodes, self.qnodes
+        return result
+
+    def _search_aspiration(self, depth, previous):
+        # Search the root within a window around the previous iteration's
+        # score, widening the side that fails until the score lands inside
+        if previous is None or depth < ASPIRATION_MIN_DEPTH or abs(previous) > MATE_BOUND:
+            self._follow_pv = bool(self._pv)
+            return self._search_root(depth)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous - delta, previous + delta
+        while True:
+            self._follow_pv = bool(self._pv)
+            move, score, pv = self._search_root(depth, alpha, beta)
+            if alpha < score < beta or move is None:
+                return move, score, pv
+            delta *= 4
+            if score <= alpha:
+                alpha = score - delta if delta < MATE_BOUND else -float('inf')
+            else:
+                beta = score + delta if delta < MATE_BOUND else float('inf')
+
+    def _search_root(self, depth, alpha=-float('inf'), beta=float('inf')):
+        # Principal variation search at the root (see negamax).  Returns
+        # (move, score, pv); on a fail low or high the score is only a bound
+        side = self.side
+        entry = self.tt.probe(self.hash_key)
+        hash_move = entry[3] if entry is not None else 0
+        moves = self.orderer.order(self._legal_moves(side), self.squares, 0, side,
+                                   hash_move, self._pv[0] if self._pv else 0)
+        alpha_orig = alpha
+        best_move, best_eval, pv = None, -float('inf'), []
+        for index, move in enumerate(moves):
+            self._make(move)
+            if index == 0:
+                eval = -self.negamax(depth - 1, -beta, -alpha)
+            else:
+                eval = -self.negamax(depth - 1, -alpha - 1, -alpha)
+                if alpha < eval < beta:
+                    eval = -self.negamax(depth - 1, -beta, -alpha)
             self.undo_move()
-            
-            if color == 'white' and eval > best_eval:
-                best_eval = eval
-                best_move = move
-            elif color == 'black' and eval < best_eval:
-                best_eval = eval
-                best_move = move
-        
-        return best_move
-    
+            self._follow_pv = False
+            if eval > best_eval:
+                best_eval, best_move = eval, move
+                if eval > alpha:
+                    alpha = eval
+                    pv = [move] + self._pv_table[1] if depth > 1 else [move]
+                    if alpha >= beta:
+                        break
+
+        if best_move is not None and alpha_orig < best_eval < beta:
+            self.tt.store(self.hash_key, depth, EXACT, best_eval, best_move)
+        if not pv and best_move is not None:  # failed low: no line, just the move
+            pv = [best_move]
+        return best_move, best_eval, pv
+
+    def _search_root_parallel(self, side, depth, workers, deterministic, previous):
+        # The root moves on worker processes (see src.parallel); previous is
+        # the last iteration's score, which sets a floor under the root window
+        from src import parallel  # imports this module, so not at the top
+
+        entry = self.tt.probe(self.hash_key)
+        hash_move = entry[3] if entry is not None else 0
+        moves = self.orderer.order(self._legal_moves(side), self.squares, 0, side,
+                                   hash_move, self._pv[0] if self._pv else 0)
+        if not moves:
+            return None, 0, []
+        # The workers share this engine's hash budget
+        hash_mb = max(1, self.tt.size * self.tt.ENTRY_BYTES // (1024 * 1024) // workers)
+        floor = -float('inf')
+        if previous is not None and depth >= ASPIRATION_MIN_DEPTH and abs(previous) < MATE_BOUND:
+            floor = previous - ASPIRATION_WINDOW
+        move, score, nodes, qnodes, pv = parallel.search_root(self, moves, depth, workers, self._deadline,
+                                                               hash_mb, self._stop, deterministic, floor)
+        self.nodes += nodes
+        self.qnodes += qnodes
+        # Root entry only: the next iteration searches this move first
+        self.tt.store(self.hash_key, depth, EXACT, score, move)
+        return move, score, pv
+
     def undo_move(self):
-        if not self.move_history:
+        if not self.game_ply:
             return
-        (from_x, from_y, to_x, to_y, original_piece, captured_piece,
-         old_en_passant_target,
-         old_white_king_moved, old_black_king_moved,
-         old_white_rooks_moved, old_black_rooks_moved) = self.move_history.pop()
+        self.game_ply -= 1
+        record = self._undo[self.game_ply]
+        move = record.move
+        self.halfmove = record.halfmove
+        if not move:  # null move
+            self.ep_square = record.ep_square
+            self.side = record.side
+            self.hash_key = record.key
+            return
+        original_piece = record.piece
+        captured_piece = record.captured
+        frm = move & 63
+        to = move >> 6 & 63
+
+        squares = self.squares
+        bbs = self.bitboards
+        occupancy = self.occupancy
+        from_bit, to_bit = BIT[frm], BIT[to]
+        side = WHITE if original_piece > 0 else BLACK
 
-        # Restore the original piece to its starting square
-        self.board[from_y-1, ord(from_x)-ord('a')] = original_piece
+        # Restore the original piece to its starting square (undoing any promotion)
+        bbs[squares[to]] ^= to_bit
+        bbs[original_piece] |= from_bit
+        occupancy[side] ^= from_bit | to_bit
+        squares[frm] = original_piece
         # Restore whatever was on the destination (captured piece or empty)
-        self.board[to_y-1, ord(to_x)-ord('a')] = captured_piece
-
-        # Restore all castling flags and en passant from the snapshot
-        self.en_passant_target = old_en_passant_target
-        self.white_king_moved = old_white_king_moved
-        self.black_king_moved = old_black_king_moved
-        self.white_rooks_moved = old_white_rooks_moved
-        self.black_rooks_moved = old_black_rooks_moved
-
-        # Castling: slide the rook back inline (mirrors make_move)
-        if abs(original_piece) == 6 and abs(ord(to_x) - ord(from_x)) == 2:
-            if to_x == 'g':  # Kingside: rook was moved h→f
-                rook_from_col, rook_to_col = ord('h') - ord('a'), ord('f') - ord('a')
-            else:  # Queenside: rook was moved a→d
-                rook_from_col, rook_to_col = ord('a') - ord('a'), ord('d') - ord('a')
-            rook = self.board[from_y-1, rook_to_col]
-            self.board[from_y-1, rook_from_col] = rook
-            self.board[from_y-1, rook_to_col] = 0
+        squares[to] = captured_piece
+        if captured_piece:
+            bbs[captured_piece] |= to_bit
+            occupancy[WHITE if captured_piece > 0 else BLACK] |= to_bit
 
-        # En passant capture: restore the bypassed pawn
-        elif abs(original_piece) == 1 and to_x != from_x and captured_piece == 0:
+        # Restore castling rights and en passant from the record
+        self.ep_square = record.ep_square
+        self.castling = record.castling
+        self.side = record.side
+        self.hash_key = record.key
+        self.eval_score = record.score
+
+        if original_piece == 6 or original_piece == -6:
+            self.king_squares[side] = frm
+        flag = move & FLAG_MASK
+        if flag == CASTLING:
+            # Slide the rook back inline (mirrors _make)
+            row = frm & ~7
+            if to & 7 == 6:  # Kingside: rook was moved h→f
+                self._shift(row + 5, row + 7)
+            else:  # Queenside: rook was moved a→d
+                self._shift(row + 3, row)
+        elif flag == EN_PASSANT:
             # The captured pawn sat on the same rank as the capturing pawn's origin
-            self.board[from_y-1, ord(to_x)-ord('a')] = -1 if original_piece > 0 else 1
\ No newline at end of file
+            pawn_sq = (frm & ~7) | (to & 7)
+            pawn = -1 if original_piece > 0 else 1
+            squares[pawn_sq] = pawn
+            bbs[pawn] |= BIT[pawn_sq]
+            occupancy[side ^ 1] |= BIT[pawn_sq]
+
+        self.occupied = occupancy[WHITE] | occupancy[BLACK]
+        if self._board_view is not None:
+            self._board_view.engine = None  # the old position must not be written back
+            self._board_view = None
@@ -1,5 +1,11 @@
+import copy
+import os
+import threading
+
 import pygame
-from src.chess_engine import ChessEngine
+from src.book import OpeningBook
+from src.chess_engine import ChessEngine, MAX_DEPTH
+from src.tablebase import Tablebases
 
 SQUARE = 100
 SIZE   = SQUARE * 8
@@ -20,10 +26,25 @@ BTN_IDLE  = ( 70,  70,  70)
 BTN_HOVER = (100, 100, 100)
 BTN_TEXT  = (255, 255, 255)
 
+# Opening book used by the AI when present (build one with python3 -m src.book)
+BOOK_PATH = "assets/book.bin"
+# Endgame tablebases, likewise optional (python3 -m src.tablebase)
+TABLEBASE_DIR = "assets/tablebases"
+
+# Posted by the background search with the AI's move
+AI_MOVE = pygame.USEREVENT
+
+# Each level gives the AI a fixed search depth, a time budget in seconds
+# (iterative deepening until it runs out), or both (time budget, depth cap).
+# 'workers' splits the search across that many processes, at most one per
+# core (no level sets it: no gain over one process has been measured);
+# 'selective' turns on null-move pruning and late-move reductions; 'ponder'
+# lets the AI think on the human's time (and then keeps its own search
+# in-process, where the pondered table entries are).
 DIFFICULTIES = {
-    'Easy':   1,   # depth 1 – looks 1 move ahead
-    'Medium': 2,   # depth 2 – looks 2 moves ahead
-    'Hard':   3,   # depth 3 – looks 3 moves ahead
+    'Easy':   {'depth': 1, 'selective': False},  # depth 1 – looks 1 move ahead
+    'Medium': {'depth': 2, 'selective': False},  # depth 2 – looks 2 moves ahead
+    'Hard':   {'time': 3.0, 'selective': True, 'ponder': True},  # 3 s per move
 }
 
 
@@ -33,7 +54,18 @@ class ChessGUI:
         self.screen = pygame.display.set_mode((SIZE, SIZE))
         pygame.display.set_caption("PyGambit")
         self.clock  = pygame.time.Clock()
+        self._ai_thread = None
+        self._ai_stop   = None   # cancel token of the running search
+        self._ponder_thread = None
+        self._ponder_stop   = None
+        self._ponder_result = None   # last iteration the ponder search completed
+        self._ai_reached    = None   # depth Black's last timed search completed
+        self.book = OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else None
+        self.tablebases = Tablebases(TABLEBASE_DIR) if os.path.isdir(TABLEBASE_DIR) else None
         self.load_images()
+        self.load_fonts()
+        self.render_board()
+        self.layout_menu()
         self.show_menu()
 
     # ------------------------------------------------------------------ setup
@@ -46,26 +78,85 @@ class ChessGUI:
             img = pygame.image.load(f"assets/images/{name}.png")
             self.images[v] = pygame.transform.scale(img, (SQUARE, SQUARE))
 
+    def load_fonts(self):
+        # SysFont searches the system font list, so each font is made once
+        self.fonts = {
+            'title':    pygame.font.SysFont("Arial", 52, bold=True),
+            'sub':      pygame.font.SysFont("Arial", 22),
+            'button':   pygame.font.SysFont("Arial", 28, bold=True),
+            'status':   pygame.font.SysFont("Arial", 38, bold=True),
+            'hint':     pygame.font.SysFont("Arial", 20),
+            'thinking': pygame.font.SysFont("Arial", 22, bold=True),
+        }
+        self._status_overlay    = None   # (text, surface, pos)
+        self._thinking_overlays = {}     # number of dots → (key, surface, pos)
+
+    def render_board(self):
+        """Prerender the empty board and the per-square highlight overlays."""
+        self.board_surface = pygame.Surface((SIZE, SIZE))
+        for row in range(8):
+            for col in range(8):
+                colour = LIGHT if (row + col) % 2 == 0 else DARK
+                sx, sy = self.to_screen(col, row)
+                pygame.draw.rect(self.board_surface, colour, (sx, sy, SQUARE, SQUARE))
+
+        self.square_overlays = {}
+        for name, rgba in (('check', CHECK_RED), ('selected', SELECTED)):
+            surf = pygame.Surface((SQUARE, SQUARE), pygame.SRCALPHA)
+            surf.fill(rgba)
+            self.square_overlays[name] = surf
+        ring = pygame.Surface((SQUARE, SQUARE), pygame.SRCALPHA)   # capture
+        pygame.draw.rect(ring, MOVE_RING, (0, 0, SQUARE, SQUARE), 8)
+        dot  = pygame.Surface((SQUARE, SQUARE), pygame.SRCALPHA)   # empty square
+        pygame.draw.circle(dot, MOVE_DOT, (SQUARE//2, SQUARE//2), 18)
+        self.square_overlays['ring'] = ring
+        self.square_overlays['dot']  = dot
+
+    def invalidate(self):
+        """Make the next frame redraw the whole window."""
+        self._drawn         = [None] * 64   # square states on screen
+        self._drawn_floats  = []            # overlays on screen
+        self._menu_drawn    = None          # hovered button on screen
+
     def show_menu(self):
         """Reset all game state and enter the difficulty-selection screen."""
+        self.cancel_ai()
+        self.stop_ponder()
+        self.invalidate()
         self.state       = 'menu'
         self.engine      = None
         self.ai_depth    = 2
+        self.ai_time     = None
+        self.ai_workers  = 1
+        self.ai_ponder   = False
+        self._ai_reached = None
         self.selected    = None
         self.legal_moves = []
         self.turn        = 'white'
         self.game_over   = False
         self.status      = ""
-
-    def start_game(self, depth):
-        self.ai_depth    = depth
+        self.check_square = None
+
+    def start_game(self, settings):
+        self.ai_depth    = settings.get('depth')
+        self.ai_time     = settings.get('time')
+        self.ai_workers  = settings.get('workers', 1)
+        self.ai_ponder   = settings.get('ponder', False)
+        self._ai_reached = None
         self.engine      = ChessEngine()
+        self.engine.book = self.book
+        self.engine.null_move_pruning = settings.get('selective', True)
+        self.engine.late_move_reductions = settings.get('selective', True)
+        self.engine.tablebases = self.tablebases
         self.selected    = None
         self.legal_moves = []
         self.turn        = 'white'
         self.game_over   = False
         self.status      = ""
+        self.check_square = None
         self.state       = 'game'
+        self.invalidate()
+        self.ponder()
 
     # ------------------------------------------------------------------ coord helpers
 
@@ -79,48 +170,59 @@ class ChessGUI:
 
     # ------------------------------------------------------------------ menu drawing
 
-    def draw_menu(self):
-        self.screen.fill(BG_DARK)
-
-        title_font = pygame.font.SysFont("Arial", 52, bold=True)
-        sub_font   = pygame.font.SysFont("Arial", 22)
-        btn_font   = pygame.font.SysFont("Arial", 28, bold=True)
-
-        # Title
-        title = title_font.render("PyGambit", True, BTN_TEXT)
-        self.screen.blit(title, (SIZE//2 - title.get_width()//2, 140))
-
-        # Subtitle
-        sub = sub_font.render("Select difficulty to start", True, (180, 180, 180))
-        self.screen.blit(sub, (SIZE//2 - sub.get_width()//2, 210))
-
-        # Buttons
+    def layout_menu(self):
         btn_w, btn_h = 260, 60
         gap          = 24
         labels       = list(DIFFICULTIES.keys())
         total_h      = len(labels) * btn_h + (len(labels)-1) * gap
         start_y      = SIZE//2 - total_h//2 + 20
 
-        mx, my = pygame.mouse.get_pos()
         self._menu_buttons = {}   # label → rect (used by click handler)
-
         for i, label in enumerate(labels):
             bx = SIZE//2 - btn_w//2
             by = start_y + i * (btn_h + gap)
-            rect = pygame.Rect(bx, by, btn_w, btn_h)
-            self._menu_buttons[label] = rect
+            self._menu_buttons[label] = pygame.Rect(bx, by, btn_w, btn_h)
 
-            colour = BTN_HOVER if rect.collidepoint(mx, my) else BTN_IDLE
+    def draw_menu(self):
+        """Draw the menu if it is new or the hovered button changed.
+
+        Returns True when the screen was drawn and needs flipping.
+        """
+        mx, my = pygame.mouse.get_pos()
+        hover  = next((label for label, rect in self._menu_buttons.items()
+                       if rect.collidepoint(mx, my)), '')
+        if hover == self._menu_drawn:
+            return False
+        self._menu_drawn = hover
+
+        self.screen.fill(BG_DARK)
+
+        # Title
+        title = self.fonts['title'].render("PyGambit", True, BTN_TEXT)
+        self.screen.blit(title, (SIZE//2 - title.get_width()//2, 140))
+
+        # Subtitle
+        sub = self.fonts['sub'].render("Select difficulty to start", True, (180, 180, 180))
+        self.screen.blit(sub, (SIZE//2 - sub.get_width()//2, 210))
+
+        # Buttons
+        for label, rect in self._menu_buttons.items():
+            colour = BTN_HOVER if label == hover else BTN_IDLE
             pygame.draw.rect(self.screen, colour, rect, border_radius=10)
 
-            depth = DIFFICULTIES[label]
-            text  = btn_font.render(f"{label}  (depth {depth})", True, BTN_TEXT)
-            self.screen.blit(text, (bx + btn_w//2 - text.get_width()//2,
-                                    by + btn_h//2 - text.get_height()//2))
+            settings = DIFFICULTIES[label]
+            if 'time' in settings:
+                limit = f"{settings['time']:g} s"
+            else:
+                limit = f"depth {settings['depth']}"
+            text  = self.fonts['button'].render(f"{label}  ({limit})", True, BTN_TEXT)
+            self.screen.blit(text, (rect.centerx - text.get_width()//2,
+                                    rect.centery - text.get_height()//2))
 
         # Small hint at bottom
-        hint = sub_font.render("Press Esc during a game to return here", True, (120, 120, 120))
+        hint = self.fonts['sub'].render("Press Esc during a game to return here", True, (120, 120, 120))
         self.screen.blit(hint, (SIZE//2 - hint.get_width()//2, SIZE - 50))
+        return True
 
     def handle_menu_click(self, sx, sy):
         for label, rect in self._menu_buttons.items():
@@ -130,69 +232,101 @@ class ChessGUI:
 
     # ------------------------------------------------------------------ game drawing
 
-    def draw_board(self):
-        for row in range(8):
-            for col in range(8):
-                colour = LIGHT if (row + col) % 2 == 0 else DARK
-                sx, sy = self.to_screen(col, row)
-                pygame.draw.rect(self.screen, colour, (sx, sy, SQUARE, SQUARE))
-
-    def draw_highlights(self):
-        # King in check
-        if self.engine.is_in_check(self.turn):
-            king_val = 6 if self.turn == 'white' else -6
-            for r in range(8):
-                for c in range(8):
-                    if self.engine.board[r, c] == king_val:
-                        self._fill_square(c, r, CHECK_RED)
-
-        # Selected square
-        if self.selected is not None:
-            self._fill_square(*self.selected, SELECTED)
-
-        # Legal move indicators
+    def square_states(self):
+        """What each square should show: (piece, in check, selected, move marker)."""
+        squares  = self.engine.squares
+        selected = None if self.selected is None else self.selected[1] * 8 + self.selected[0]
+        markers  = {}
         for mx, my in self.legal_moves:
-            c = ord(mx) - ord('a')
-            r = my - 1
-            sx, sy = self.to_screen(c, r)
-            surf = pygame.Surface((SQUARE, SQUARE), pygame.SRCALPHA)
-            if self.engine.board[r, c] != 0:          # capture → ring
-                pygame.draw.rect(surf, MOVE_RING, (0, 0, SQUARE, SQUARE), 8)
-            else:                                      # empty → dot
-                pygame.draw.circle(surf, MOVE_DOT, (SQUARE//2, SQUARE//2), 18)
-            self.screen.blit(surf, (sx, sy))
-
-    def draw_pieces(self):
-        for row in range(8):
-            for col in range(8):
-                piece = self.engine.board[row, col]
-                if piece != 0:
-                    sx, sy = self.to_screen(col, row)
-                    self.screen.blit(self.images[piece], (sx, sy))
-
-    def draw_status(self):
-        if not self.status:
-            return
-        font = pygame.font.SysFont("Arial", 38, bold=True)
-        text = font.render(self.status, True, (255, 255, 255))
-        pad  = 18
-        w    = text.get_width() + pad * 2
-        h    = text.get_height() + pad
-        bg   = pygame.Surface((w, h), pygame.SRCALPHA)
-        bg.fill((0, 0, 0, 190))
-        bx, by = SIZE//2 - w//2, SIZE//2 - h//2
-        self.screen.blit(bg, (bx, by))
-        self.screen.blit(text, (bx + pad, by + pad//2))
-
-        # Prompt to return to menu
-        hint_font = pygame.font.SysFont("Arial", 20)
-        hint = hint_font.render("Press Esc to play again", True, (200, 200, 200))
-        self.screen.blit(hint, (SIZE//2 - hint.get_width()//2, by + h + 8))
-
-    def _fill_square(self, col, row, rgba):
-        surf = pygame.Surface((SQUARE, SQUARE), pygame.SRCALPHA)
-        surf.fill(rgba)
-        self.screen.blit(surf, self.to_screen(col, row))
+            sq = (my - 1) * 8 + ord(mx) - ord('a')
+            markers[sq] = 'ring' if squares[sq] else 'dot'
+        return [(squares[sq], sq == self.check_square, sq == selected, markers.get(sq))
+                for sq in range(64)]
+
+    def draw_square(self, sq, state):
+        piece, check, selected, marker = state
+        pos  = self.to_screen(sq & 7, sq >> 3)
+        rect = pygame.Rect(pos, (SQUARE, SQUARE))
+        self.screen.blit(self.board_surface, pos, rect)
+        if check:
+            self.screen.blit(self.square_overlays['check'], pos)
+        if selected:
+            self.screen.blit(self.square_overlays['selected'], pos)
+        if marker:
+            self.screen.blit(self.square_overlays[marker], pos)
+        if piece:
+            self.screen.blit(self.images[piece], pos)
+        return rect
+
+    def status_overlay(self):
+        # Result box with the prompt to return to the menu, rendered once per status
+        if self._status_overlay is None or self._status_overlay[0] != self.status:
+            text = self.fonts['status'].render(self.status, True, (255, 255, 255))
+            hint = self.fonts['hint'].render("Press Esc to play again", True, (200, 200, 200))
+            pad  = 18
+            w    = text.get_width() + pad * 2
+            h    = text.get_height() + pad
+            full_w = max(w, hint.get_width())
+            surf = pygame.Surface((full_w, h + 8 + hint.get_height()), pygame.SRCALPHA)
+            surf.fill((0, 0, 0, 190), (full_w//2 - w//2, 0, w, h))
+            surf.blit(text, (full_w//2 - w//2 + pad, pad//2))
+            surf.blit(hint, (full_w//2 - hint.get_width()//2, h + 8))
+            pos  = (SIZE//2 - full_w//2, SIZE//2 - h//2)
+            self._status_overlay = (self.status, surf, pos)
+        return self._status_overlay
+
+    def thinking_overlay(self):
+        dots = pygame.time.get_ticks() // 400 % 4
+        if dots not in self._thinking_overlays:
+            font = self.fonts['thinking']
+            text = font.render("Black is thinking" + "." * dots, True, (255, 255, 255))
+            # Fixed width so the box does not jump as the dots change
+            w, h = font.size("Black is thinking...")[0] + 24, text.get_height() + 12
+            surf = pygame.Surface((w, h), pygame.SRCALPHA)
+            surf.fill((0, 0, 0, 160))
+            surf.blit(text, (12, 6))
+            self._thinking_overlays[dots] = (('thinking', dots), surf, (10, 10))
+        return self._thinking_overlays[dots]
+
+    def _squares_under(self, surf, pos):
+        rect = pygame.Rect(pos, surf.get_size())
+        return {(7 - r) * 8 + c
+                for r in range(max(0, rect.top // SQUARE), min(8, (rect.bottom - 1) // SQUARE + 1))
+                for c in range(max(0, rect.left // SQUARE), min(8, (rect.right - 1) // SQUARE + 1))}
+
+    def draw_game(self):
+        """Redraw what changed since the last frame; return the dirty rects.
+
+        A square is repainted only when its piece or highlight changed, or
+        when a floating overlay (result box, thinking indicator) over it
+        appeared, changed or went away.  An idle position draws nothing.
+        """
+        floats = []
+        if self.status:
+            floats.append(self.status_overlay())
+        if self._ai_stop is not None:
+            floats.append(self.thinking_overlay())
+
+        states  = self.square_states()
+        changed = {sq for sq in range(64) if states[sq] != self._drawn[sq]}
+        if [key for key, _, _ in floats] != [key for key, _, _ in self._drawn_floats]:
+            for _, surf, pos in self._drawn_floats + floats:
+                changed |= self._squares_under(surf, pos)
+        # A translucent overlay is redrawn over all of its squares, never over itself
+        redraw = []
+        for overlay in floats:
+            under = self._squares_under(overlay[1], overlay[2])
+            if under & changed:
+                changed |= under
+                redraw.append(overlay)
+
+        dirty = [self.draw_square(sq, states[sq]) for sq in changed]
+        for sq in changed:
+            self._drawn[sq] = states[sq]
+        for _, surf, pos in redraw:
+            self.screen.blit(surf, pos)
+        self._drawn_floats = floats
+        return dirty
 
     # ------------------------------------------------------------------ game logic
 
@@ -212,11 +346,13 @@ class ChessGUI:
             from_y = sr + 1
 
             if (x, y) in self.legal_moves:
+                reply = self.stop_ponder((from_x, from_y, x, y))
                 self.engine.make_move(from_x, from_y, x, y)
                 self.selected, self.legal_moves = None, []
                 if not self.check_game_over('black'):
                     self.turn = 'black'
-                    pygame.time.set_timer(pygame.USEREVENT, 150)
+                    self.ai_move(reply)
+                self.update_check()
                 return
 
             if piece > 0:                            # re-select own piece
@@ -231,24 +367,131 @@ class ChessGUI:
             self.selected    = (col, row)
             self.legal_moves = self.engine.get_legal_moves(x, y)
 
-    def ai_move(self):
-        move = self.engine.choose_best_move('black', self.ai_depth)
+    def searcher(self):
+        """A copy of the engine to search on, sharing its tables."""
+        searcher = copy.deepcopy(self.engine)
+        searcher.tt, searcher.orderer = self.engine.tt, self.engine.orderer
+        searcher.book = self.engine.book
+        searcher.tablebases = self.engine.tablebases
+        return searcher
+
+    def ai_move(self, reply=None):
+        """Start Black's search on a background thread.
+
+        The search runs on a copy of the engine (sharing its transposition
+        table) so the board keeps drawing the real position meanwhile.  The
+        move comes back as an AI_MOVE event; cancel_ai stops the search.
+        A reply already found by pondering is played without searching.
+        """
+        stop = threading.Event()
+        self._ai_stop = stop
+        if reply is not None:
+            pygame.event.post(pygame.event.Event(AI_MOVE, move=reply, stop=stop))
+            return
+        searcher = self.searcher()
+        # After pondering the search stays in this process: worker processes
+        # start from empty tables and would not see what pondering stored
+        workers = 1 if self.ai_ponder else self.ai_workers
+
+        def search():
+            result = searcher.search('black', self.ai_depth, time_limit=self.ai_time,
+                                     workers=workers, stop=stop)
+            if result is not None and result.depth and not stop.is_set():
+                self._ai_reached = result.depth  # what a ponder hit has to match
+            move = None if result is None else result.move
+            pygame.event.post(pygame.event.Event(AI_MOVE, move=move, stop=stop))
+
+        self._ai_thread = threading.Thread(target=search, daemon=True)
+        self._ai_thread.start()
+
+    def ponder(self):
+        """Search White's position on a background thread during the human's turn.
+
+        The search shares the engine's transposition table, so whatever the
+        human plays, Black's search starts with the replies it looked at
+        already in the table.  Its principal variation also predicts the
+        human's move and Black's answer (see stop_ponder).
+        """
+        if not self.ai_ponder or self.game_over:
+            return
+        searcher = self.searcher()
+        stop = threading.Event()
+
+        def record(result):  # each completed iteration, not the one stopped halfway
+            self._ponder_result = result
+
+        def search():
+            searcher.search('white', MAX_DEPTH, workers=1, stop=stop, report=record)
+
+        self._ponder_result = None
+        self._ponder_stop   = stop
+        self._ponder_thread = threading.Thread(target=search, daemon=True)
+        self._ponder_thread.start()
+
+    def stop_ponder(self, played=None):
+        """Stop pondering; return Black's reply to played if it was foreseen.
+
+        That is a ponder hit: the human played the predicted move and the
+        last completed iteration searched the reply (one ply less deep than
+        itself) at least as deep as ai_move would: its fixed depth, or the
+        depth Black's last timed search reached.  Otherwise None, and Black
+        searches as usual.
+        """
+        if self._ponder_thread is None:
+            return None
+        self._ponder_stop.set()
+        self._ponder_thread.join()
+        self._ponder_thread = None
+        self._ponder_stop   = None
+        result = self._ponder_result
+        if played is None or result is None:  # stopped before its first iteration finished
+            return None
+        if len(result.pv) < 2 or result.pv[0] != played:
+            return None
+        target = self.ai_depth if self.ai_time is None else self._ai_reached
+        if target is not None and result.depth - 1 >= target:
+            return result.pv[1]
+        return None
+
+    def cancel_ai(self):
+        """Stop a running search and wait for its thread (a few ms)."""
+        if self._ai_thread is not None:
+            self._ai_stop.set()
+            self._ai_thread.join()
+        self._ai_thread = None
+        self._ai_stop   = None
+
+    def finish_ai_move(self, move, stop):
+        if stop is not self._ai_stop:   # result of a cancelled search
+            return
+        self._ai_thread = None
+        self._ai_stop   = None
         if move:
             self.engine.make_move(*move)
         if not self.check_game_over('white'):
             self.turn = 'white'
+            self.ponder()
+        self.update_check()
+
+    def update_check(self):
+        # The king to mark red is worked out once per move, not every frame
+        self.check_square = None
+        if self.engine.is_in_check(self.turn):
+            self.check_square = self.engine.squares.index(6 if self.turn == 'white' else -6)
 
     def check_game_over(self, color):
-        if self.engine.is_checkmate(color):
+        status = self.engine.game_status(color)
+        if status is None:
+            return False
+        if status == 'checkmate':
             winner = 'Black' if color == 'white' else 'White'
-            self.status    = f"Checkmate — {winner} wins!"
-            self.game_over = True
-            return True
-        if len(self.engine.get_all_moves(color)) == 0:
-            self.status    = "Stalemate!"
-            self.game_over = True
-            return True
-        return False
+            self.status = f"Checkmate — {winner} wins!"
+        elif status == 'stalemate':
+            self.status = "Stalemate!"
+        else:
+            self.status = f"Draw by {status}!"
+        self.game_over = True
+        return True
 
     # ------------------------------------------------------------------ main loop
 
@@ -257,11 +500,12 @@ class ChessGUI:
         while running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.cancel_ai()
+                    self.stop_ponder()
                     running = False
 
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
-                        pygame.time.set_timer(pygame.USEREVENT, 0)
                         self.show_menu()
 
                 elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
@@ -270,19 +514,19 @@ class ChessGUI:
                     else:
                         self.handle_game_click(*event.pos)
 
-                elif event.type == pygame.USEREVENT:
-                    pygame.time.set_timer(pygame.USEREVENT, 0)
-                    self.ai_move()
+                elif event.type == AI_MOVE:
+                    self.finish_ai_move(event.move, event.stop)
+
+                elif event.type == pygame.VIDEOEXPOSE:
+                    self.invalidate()
 
             if self.state == 'menu':
-                self.draw_menu()
+                if self.draw_menu():
+                    pygame.display.flip()
             else:
-                self.draw_board()
-                self.draw_highlights()
-                self.draw_pieces()
-                self.draw_status()
-
-            pygame.display.flip()
+                dirty = self.draw_game()
+                if dirty:
+                    pygame.display.update(dirty)
             self.clock.tick(60)
 
         pygame.quit()
@@ -0,0 +1,104 @@
+from src.moves import FLAG_MASK, EN_PASSANT, PROMOTION
+
+MAX_PLY = 128
+
+# Sort keys: the PV and hash moves first, then captures, killers and finally
+# quiet moves by history score (history stays far below KILLER_SCORE)
+PV_SCORE = 1 << 40
+HASH_SCORE = 1 << 39
+CAPTURE_SCORE = 1 << 36
+KILLER_SCORE = (1 << 35, 1 << 34)
+HISTORY_LIMIT = 1 << 30
+
+# Victim values for most-valuable-victim / least-valuable-attacker ordering
+VICTIM_VALUES = [0, 100, 320, 330, 500, 900, 20000]
+
+
+class MoveOrderer:
+    """Move ordering state for one engine's alpha-beta search.
+
+    Killer moves are quiet moves that caused a cutoff at the same ply in a
+    sibling subtree; the history table counts cutoffs per (side, from, to)
+    weighted by depth.  Moves are packed ints (see src.moves).
+
+    cutoffs counts the cutoffs recorded and first_move_cutoffs the ones
+    caused by the move searched first; together they measure how often the
+    ordering put the refuting move first.
+    """
+
+    def __init__(self):
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 4096 for _ in range(2)]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        # Killers are position-specific; history is only aged
+        for slot in self.killers:
+            slot[0] = slot[1] = 0
+        for table in self.history:
+            for i in range(4096):
+                table[i] >>= 1
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def order(self, moves, squares, ply, side, hash_move=0, pv_move=0):
+        """Return moves sorted best-first for searching at ply."""
+        if len(moves) < 2:
+            return moves
+        killer1, killer2 = self.killers[min(ply, MAX_PLY - 1)]
+        history = self.history[side]
+        keyed = []
+        for move in moves:
+            if move == pv_move:
+                score = PV_SCORE
+            elif move == hash_move:
+                score = HASH_SCORE
+            else:
+                victim = squares[move >> 6 & 63]
+                attacker = squares[move & 63]
+                if attacker < 0:
+                    attacker = -attacker
+                flag = move & FLAG_MASK
+                if victim:
+                    score = CAPTURE_SCORE + VICTIM_VALUES[victim if victim > 0 else -victim] * 8 - attacker
+                elif flag == EN_PASSANT:
+                    score = CAPTURE_SCORE + VICTIM_VALUES[1] * 8 - 1
+                elif flag == PROMOTION:
+                    score = CAPTURE_SCORE + VICTIM_VALUES[5] * 8
+                elif move == killer1:
+                    score = KILLER_SCORE[0]
+                elif move == killer2:
+                    score = KILLER_SCORE[1]
+                else:
+                    score = history[move & 4095]
+            keyed.append((score, move))
+        keyed.sort(key=_score, reverse=True)
+        return [move for _, move in keyed]
+
+    def record_cutoff(self, move, squares, ply, side, depth, first):
+        """Note that move caused a beta cutoff; squares is the position before it."""
+        self.cutoffs += 1
+        if first:
+            self.first_move_cutoffs += 1
+        if squares[move >> 6 & 63] or move & FLAG_MASK == EN_PASSANT:
+            return  # captures are already ordered by MVV-LVA
+        slot = self.killers[min(ply, MAX_PLY - 1)]
+        if slot[0] != move:
+            slot[1] = slot[0]
+            slot[0] = move
+        history = self.history[side]
+        index = move & 4095  # from and to squares
+        history[index] += depth * depth
+        if history[index] > HISTORY_LIMIT:
+            for table in self.history:
+                for i in range(4096):
+                    table[i] >>= 1
+
+    def first_move_cutoff_rate(self):
+        # Share of beta cutoffs produced by the first move searched
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+
+def _score(item):
+    return item[0]
@@ -0,0 +1,41 @@
+# Packed move encoding and castling-rights bits used by ChessEngine.
+#
+# A move is a 16-bit int: bits 0-5 hold the from square, 6-11 the to square,
+# 12-13 a flag and 14-15 the promotion piece (0 knight ... 3 queen, only read
+# for PROMOTION moves).  0 (a1 to a1) is never a legal move and stands for
+# "no move", e.g. in the transposition table.
+
+from src.bitboard import square_name
+
+NORMAL, CASTLING, EN_PASSANT, PROMOTION = 0, 1 << 12, 2 << 12, 3 << 12
+FLAG_MASK = 3 << 12
+QUEEN_PROMOTION = PROMOTION | 3 << 14
+
+# Castling rights as a 4-bit mask
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+
+
+def _castling_mask():
+    # CASTLING_MASK[sq]: rights that survive a move from or to sq.  Moving the
+    # king or a rook off its square, or capturing a rook on it, clears them.
+    mask = [ALL_CASTLING] * 64
+    mask[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+    mask[7] &= ~WHITE_KINGSIDE
+    mask[0] &= ~WHITE_QUEENSIDE
+    mask[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+    mask[63] &= ~BLACK_KINGSIDE
+    mask[56] &= ~BLACK_QUEENSIDE
+    return mask
+
+
+CASTLING_MASK = _castling_mask()
+
+
+def encode_move(frm, to, flags=NORMAL):
+    return frm | to << 6 | flags
+
+
+def move_name(move):
+    """Packed move -> ('e', 2, 'e', 4), the tuple form of the public API."""
+    return square_name(move & 63) + square_name(move >> 6 & 63)
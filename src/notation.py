@@ -0,0 +1,162 @@
+# Standard algebraic notation (SAN) for packed moves, as used in PGN files,
+# UCI long algebraic moves ('e7e8q') and EPD records (FEN fields plus
+# operations such as 'bm e4;').
+
+from src.bitboard import FILES, parse_square, square_name
+from src.moves import FLAG_MASK, CASTLING, EN_PASSANT, PROMOTION
+
+PIECE_LETTERS = {'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6}
+
+
+def parse_san(engine, san):
+    """Return the packed legal move for a SAN string in engine's position.
+
+    Accepts the usual forms ('e4', 'exd5', 'Nbd7', 'R1e2', 'O-O-O',
+    'e8=Q+', 'Qh4#!') and raises ValueError when the string matches no
+    legal move or more than one.  The engine always promotes to a queen, so
+    other promotions are rejected.
+    """
+    text = san.rstrip('+#!?')
+    moves = engine._legal_moves(engine.side)
+
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        to_file = 6 if len(text) == 3 else 2
+        for move in moves:
+            if move & FLAG_MASK == CASTLING and (move >> 6) & 7 == to_file:
+                return move
+        raise ValueError(f"Illegal castling move: {san!r}")
+
+    promotion = None
+    if '=' in text:
+        text, promotion = text.split('=', 1)
+    elif len(text) > 2 and text[-1] in 'NBRQ' and text[0].islower():
+        text, promotion = text[:-1], text[-1]  # 'e8Q'
+    if promotion is not None and promotion != 'Q':
+        raise ValueError(f"Only queen promotions are supported: {san!r}")
+
+    kind = PIECE_LETTERS.get(text[:1], 1)
+    body = (text[1:] if kind != 1 else text).replace('x', '').replace('-', '')
+    if len(body) < 2 or body[-2] not in 'abcdefgh' or body[-1] not in '12345678':
+        raise ValueError(f"Invalid SAN move: {san!r}")
+    to = parse_square(body[-2], int(body[-1]))
+    hint = body[:-2]  # disambiguation: from file, rank or both
+
+    squares = engine.squares
+    candidates = []
+    for move in moves:
+        frm = move & 63
+        if (move >> 6) & 63 != to or abs(squares[frm]) != kind:
+            continue
+        if any(not _matches(frm, char) for char in hint):
+            continue
+        if (promotion is not None) != (move & FLAG_MASK == PROMOTION):
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} SAN move: {san!r}")
+    return candidates[0]
+
+
+def _matches(frm, char):
+    if char in 'abcdefgh':
+        return frm & 7 == ord(char) - ord('a')
+    if char in '12345678':
+        return frm >> 3 == int(char) - 1
+    return False
+
+
+def move_to_san(engine, move):
+    """SAN string for a packed legal move in engine's position ('Nbd7', 'exd5', 'e8=Q+')."""
+    frm, to = move & 63, move >> 6 & 63
+    flag = move & FLAG_MASK
+    if flag == CASTLING:
+        san = 'O-O' if to & 7 == 6 else 'O-O-O'
+    else:
+        squares = engine.squares
+        kind = abs(squares[frm])
+        capture = squares[to] or flag == EN_PASSANT
+        target = '%s%d' % square_name(to)
+        if kind == 1:
+            san = (FILES[frm & 7] + 'x' if capture else '') + target
+            if flag == PROMOTION:
+                san += '=Q'
+        else:
+            # Disambiguate by file, then rank, then both
+            rivals = [other & 63 for other in engine._legal_moves(engine.side)
+                      if other >> 6 & 63 == to and other & 63 != frm and abs(squares[other & 63]) == kind]
+            hint = ''
+            if rivals:
+                if all(sq & 7 != frm & 7 for sq in rivals):
+                    hint = FILES[frm & 7]
+                elif all(sq >> 3 != frm >> 3 for sq in rivals):
+                    hint = str((frm >> 3) + 1)
+                else:
+                    hint = '%s%d' % square_name(frm)
+            san = 'NBRQK'[kind - 2] + hint + ('x' if capture else '') + target
+    engine._make(move)
+    if engine._in_check(engine.side):
+        san += '#' if not engine._legal_moves(engine.side) else '+'
+    engine.undo_move()
+    return san
+
+
+# ------------------------------------------------------------------ UCI
+
+def move_to_uci(move):
+    """UCI long algebraic string for a packed move ('e2e4', 'e1g1', 'e7e8q')."""
+    text = '%s%d%s%d' % (square_name(move & 63) + square_name(move >> 6 & 63))
+    return text + 'q' if move & FLAG_MASK == PROMOTION else text
+
+
+def parse_uci(engine, text):
+    """Return the packed legal move for a UCI string in engine's position.
+
+    Raises ValueError for an illegal move or a promotion to anything but
+    a queen.
+    """
+    for move in engine._legal_moves(engine.side):
+        if move_to_uci(move) == text:
+            return move
+    if len(text) == 5 and text[4] in 'nbr':
+        raise ValueError(f"Only queen promotions are supported: {text!r}")
+    raise ValueError(f"Illegal UCI move: {text!r}")
+
+
+# ------------------------------------------------------------------ EPD
+
+def parse_epd(line):
+    """Split an EPD record into its four FEN fields and its operations.
+
+    'rnbqkbnr/... w KQkq - bm e4; id "start";' ->
+    ('rnbqkbnr/... w KQkq -', {'bm': 'e4', 'id': '"start"'}).  Operand
+    strings keep their quotes; raises ValueError on a short record.
+    """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD record: {line!r}")
+    operations = {}
+    for operation in _split_operations(fields[4] if len(fields) > 4 else ''):
+        opcode, _, operand = operation.strip().partition(' ')
+        if opcode:
+            operations[opcode] = operand.strip()
+    return ' '.join(fields[:4]), operations
+
+
+def _split_operations(text):
+    # Operations end at semicolons, except inside quoted strings
+    operations, start, quoted = [], 0, False
+    for index, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif char == ';' and not quoted:
+            operations.append(text[start:index])
+            start = index + 1
+    operations.append(text[start:])
+    return operations
+
+
+def format_epd(position, operations):
+    """EPD record for four FEN fields and {opcode: operand} operations."""
+    ops = ''.join(f" {opcode} {operand};" if f"{operand}" else f" {opcode};"
+                  for opcode, operand in operations.items())
+    return position + ops
@@ -0,0 +1,208 @@
+"""Root-parallel search over a pool of worker processes.
+
+ChessEngine.choose_best_move(..., workers=N) hands the root moves of each
+iteration out to N worker processes.  Every worker has a ChessEngine of its
+own; a task only carries the position as a FEN and the moves played since
+the last capture or pawn move (so repetitions are still seen), the search
+settings and the root move.  The best root score found so far sits in
+shared memory; a worker reads it before it starts on a move, so root moves
+searched later are still cut off against it.
+
+Each worker keeps its transposition table and move orderer from one root
+move to the next and from one iteration to the next, as the serial search
+does, so later moves and deeper iterations start from what it has learned.
+Moves after the first are tried with a zero window at the best score so
+far and only searched with the open window when they reach it.
+The first iteration's score also gives the next one a floor: root moves are
+only searched above previous - ASPIRATION_WINDOW, and the iteration is
+searched again without it in the rare case that every move falls below.
+
+A fixed-depth search (deterministic=True, no time limit) trades that reuse
+for reproducibility; which worker finishes first then does not change the
+chosen move:
+
+* each root move is searched with an empty transposition table and move
+  orderer, and table entries only cut off at the depth they were stored at,
+  so a move's score never depends on what the worker searched before it;
+* the window opens one point below the shared best, so a move that ties the
+  best gets its exact score rather than a bound;
+* the best exact score wins, ties going to the move earliest in root order.
+"""
+
+import atexit
+import multiprocessing
+
+from src.move_ordering import MoveOrderer
+
+# ChessEngine attributes a task copies to the worker's engine
+SETTINGS = ('quiescence', 'null_move_pruning', 'late_move_reductions', 'batch_frontier',
+            'tablebases')
+
+# The pool is kept between searches: starting worker processes costs far
+# more than a shallow search.  Only one is kept; a search with another
+# worker count or table size shuts it down and starts its own.
+_pool = None  # ((workers, hash_mb), pool, shared_best, stop_workers)
+
+# Worker-process globals, set by _init_worker
+_shared_best = None  # best root score of the running search, for the side to move
+_stop_workers = None  # set to cancel the running search
+_engine = None  # the worker's ChessEngine, with its table and orderer
+_position = None  # (FEN, moves) _engine is set up with
+
+
+def _init_worker(shared_best, stop_workers, hash_mb):
+    global _shared_best, _stop_workers, _engine
+    from src.chess_engine import ChessEngine  # imports this module, so not at the top
+
+    _shared_best = shared_best
+    _stop_workers = stop_workers
+    _engine = ChessEngine(hash_mb)
+
+
+def _root_position(engine):
+    # engine's position as (FEN, moves): the position after the last capture
+    # or pawn move and the moves played since, the only ones that can repeat
+    count = min(engine.halfmove, engine.game_ply)
+    moves = tuple(record.move for record in engine._undo[engine.game_ply - count:engine.game_ply])
+    for _ in moves:
+        engine.undo_move()
+    fen = engine.to_fen()
+    for move in moves:
+        engine._make(move)
+    return fen, moves
+
+
+def _search_move(position, settings, move, depth, deadline, deterministic):
+    # Score one root move of position in a worker process.  Returns (score,
+    # exact, nodes, qnodes, pv) with the score for the side to move; score is
+    # None when the search was cut short.
+    global _position
+    from src.chess_engine import SearchTimeout
+
+    engine = _engine
+    if position != _position:
+        fen, moves = position
+        engine.load_fen(fen)
+        for played in moves:
+            engine._make(played)
+        # A new search: age the table and orderer like ChessEngine.search does
+        engine.tt.new_search()
+        engine.orderer.new_search()
+        _position = position
+    for name, value in zip(SETTINGS, settings):
+        setattr(engine, name, value)
+    if deterministic:
+        engine.tt.clear()
+        engine.orderer = MoveOrderer()
+    engine._tt_same_depth = deterministic
+    engine._deadline = deadline
+    engine._stop = _stop_workers
+    engine._root_ply = engine.game_ply
+    engine._pv = []
+    engine._follow_pv = False
+    engine.nodes = engine.qnodes = 0
+
+    best = _shared_best.value
+    engine._make(move)
+    try:
+        if not deterministic and best > -float('inf'):
+            # Zero window first, as in the serial PVS: only a move that can
+            # reach the best so far gets the open window
+            score = -engine.negamax(depth - 1, -best, 1 - best)
+            if score >= best:
+                score = -engine.negamax(depth - 1, -float('inf'), 1 - best)
+        else:
+            score = -engine.negamax(depth - 1, -float('inf'), 1 - best)
+    except SearchTimeout:
+        return None, False, engine.nodes, engine.qnodes, []
+    finally:
+        while engine.game_ply > engine._root_ply:  # back to the root for the next task
+            engine.undo_move()
+
+    exact = score > best - 1  # otherwise it failed low: only an upper bound
+    if exact:
+        with _shared_best.get_lock():
+            if score > _shared_best.value:
+                _shared_best.value = score
+    pv = [move] + engine._pv_table[1] if depth > 1 else [move]
+    return score, exact, engine.nodes, engine.qnodes, pv
+
+
+def _get_pool(workers, hash_mb):
+    global _pool
+    key = (workers, hash_mb)
+    if _pool is None or _pool[0] != key:
+        shutdown()
+        context = multiprocessing.get_context()
+        shared_best = context.Value('d', -float('inf'))
+        stop_workers = context.Event()
+        pool = context.Pool(workers, initializer=_init_worker,
+                            initargs=(shared_best, stop_workers, hash_mb))
+        _pool = key, pool, shared_best, stop_workers
+    return _pool[1:]
+
+
+def shutdown():
+    """Stop the worker pool started by search_root, if any."""
+    global _pool
+    if _pool is not None:
+        pool = _pool[1]
+        pool.terminate()
+        pool.join()
+        _pool = None
+
+
+atexit.register(shutdown)
+
+
+def _result(task, stop, stop_workers):
+    # Wait for a task, passing a stop request on to the workers
+    if stop is not None:
+        while not task.ready():
+            task.wait(0.01)
+            if stop.is_set():
+                stop_workers.set()
+    return task.get()
+
+
+def search_root(engine, moves, depth, workers, deadline=None, hash_mb=4, stop=None,
+                deterministic=True, floor=-float('inf')):
+    """Search the root moves of engine's position depth plies deep.
+
+    moves are the legal root moves in search order.  Returns (move, score,
+    nodes, qnodes, pv) with the score for the side to move and pv the best
+    move's principal variation.  Raises SearchTimeout when deadline (a
+    time.time() value) passes or stop (a threading.Event) is set before
+    every move is scored.  deterministic and floor are described in the
+    module docstring; with a floor that every move falls below, the moves
+    are searched again without it.
+    """
+    from src.chess_engine import SearchTimeout
+
+    pool, shared_best, stop_workers = _get_pool(workers, hash_mb)
+    position = _root_position(engine)
+    settings = tuple(getattr(engine, name) for name in SETTINGS)
+    nodes = qnodes = 0
+    while True:
+        shared_best.value = floor
+        stop_workers.clear()
+        tasks = [(position, settings, move, depth, deadline, deterministic) for move in moves]
+        # The first move is searched on its own so the rest start with a bound
+        results = [_result(pool.apply_async(_search_move, tasks[0]), stop, stop_workers)]
+        pending = [pool.apply_async(_search_move, task) for task in tasks[1:]]
+        results.extend(_result(task, stop, stop_workers) for task in pending)
+
+        nodes += sum(result[2] for result in results)
+        qnodes += sum(result[3] for result in results)
+        if any(result[0] is None for result in results):
+            raise SearchTimeout
+        exact = [index for index, result in enumerate(results) if result[1]]
+        if exact or floor == -float('inf'):
+            break
+        floor = -float('inf')  # every move failed low: search again without the floor
+    best_index = exact[0] if exact else 0
+    for index in exact:
+        if results[index][0] > results[best_index][0]:
+            best_index = index
+    score, _, _, _, pv = results[best_index]
+    return moves[best_index], score, nodes, qnodes, pv
@@ -0,0 +1,94 @@
+"""Perft regression and move-generation benchmark.
+
+    python3 -m src.perft                 # standard positions up to depth 4
+    python3 -m src.perft --depth 3       # quicker run
+    python3 -m src.perft --fen "<FEN>" --divide 3
+
+Every position's node counts are checked against known values and the
+run fails (exit status 1) on any mismatch.  The engine always promotes to
+a queen, so positions where promotions occur within the tested depth use
+queen-only counts; the others are the published perft numbers.
+"""
+
+import argparse
+import sys
+import time
+
+from src.chess_engine import ChessEngine
+
+# (name, FEN, expected node counts for depth 1, 2, 3, ...)
+POSITIONS = [
+    ("start",
+     "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete",  # castling, en passant, pins
+     "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4074224]),
+    ("endgame",  # en passant discovered checks along the rank
+     "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("promotions",  # promotions and captures on b1/g1, castling out of danger
+     "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 228, 8087, 320802]),
+    ("promotion-capture",
+     "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [41, 1373, 54007, 1806790]),
+    ("middlegame",
+     "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def run_suite(max_depth, out=sys.stdout):
+    """Run every position to max_depth; return True when all counts match."""
+    engine = ChessEngine(hash_mb=1)
+    all_ok = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in POSITIONS:
+        engine.load_fen(fen)
+        for depth, want in enumerate(expected[:max_depth], start=1):
+            start = time.perf_counter()
+            nodes = engine.perft(depth)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            ok = nodes == want
+            all_ok = all_ok and ok
+            nps = nodes / elapsed if elapsed > 0 else 0
+            print(f"{name:<18} depth {depth}  {nodes:>9} nodes  "
+                  f"{'ok' if ok else f'FAIL (expected {want})':<8} "
+                  f"{elapsed:8.3f} s  {nps:>10,.0f} nps", file=out)
+    nps = total_nodes / total_time if total_time > 0 else 0
+    print(f"total {total_nodes} nodes in {total_time:.2f} s ({nps:,.0f} nps)", file=out)
+    return all_ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft move-generation check and benchmark")
+    parser.add_argument("--depth", type=int, default=4, help="deepest perft depth to run (default 4)")
+    parser.add_argument("--fen", help="run a single position instead of the standard suite")
+    parser.add_argument("--divide", type=int, metavar="DEPTH",
+                        help="with --fen, print the node count below each root move")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        engine = ChessEngine(hash_mb=1)
+        engine.load_fen(args.fen)
+        if args.divide:
+            counts = engine.divide(args.divide)
+            for move, nodes in sorted(counts.items()):
+                print(f"{move[0]}{move[1]}{move[2]}{move[3]}: {nodes}")
+            print(f"total {sum(counts.values())}")
+        else:
+            for depth in range(1, args.depth + 1):
+                start = time.perf_counter()
+                nodes = engine.perft(depth)
+                print(f"depth {depth}  {nodes:>9} nodes  {time.perf_counter() - start:8.3f} s")
+        return 0
+
+    return 0 if run_suite(args.depth) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
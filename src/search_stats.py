@@ -0,0 +1,180 @@
+import time
+
+# Search statistics gathered by wrapping ChessEngine methods on the instance.
+#
+# Setting engine.stats = SearchStats() makes each search() attach the object
+# before its first iteration and detach it afterwards.  While attached, the
+# engine's negamax, _quiesce, _legal_moves, _in_check and evaluate_board, and
+# its transposition table's probe, are instance attributes that count (and
+# time) each call and then call the class method.  The search code itself is
+# unchanged, so with engine.stats left at None a search runs exactly the code
+# it always did.
+#
+# Only the search in this process is seen: with workers > 1 the root moves
+# are searched in worker processes and only the root counts come through.
+
+# Engine methods replaced while a SearchStats is attached
+WRAPPED_METHODS = ('negamax', '_quiesce', '_legal_moves', '_in_check', 'evaluate_board')
+
+
+class SearchStats:
+    """Counters and timings for the last search of the engine it is set on.
+
+    Per ply from the root: nodes[ply] counts negamax calls, leaves[ply] the
+    ones at the horizon (depth 0, handed to quiescence or evaluated) and
+    cutoffs[ply] the ones that failed high.  iteration_nodes holds the
+    running node total after each completed iteration.  Times are in
+    seconds; movegen_time excludes the legality checks it makes, which are
+    counted in legality_time with the search's own _in_check calls.
+
+    callback, if given, is called with this object every `every` nodes
+    (negamax and quiescence together) for live progress.  timings=False
+    skips the clock calls and the three timed wrappers.
+    """
+
+    def __init__(self, callback=None, every=10000, timings=True):
+        self.callback = callback
+        self.every = every
+        self.timings = timings
+        self.reset()
+
+    def reset(self):
+        self.nodes = []
+        self.leaves = []
+        self.cutoffs = []
+        self.qnodes = 0
+        self.total_nodes = 0
+        self.iteration_nodes = []
+        self.movegen_time = self.legality_time = self.eval_time = 0.0
+        self.movegen_calls = self.legality_calls = self.eval_calls = 0
+        self.tt_probes = self.tt_hits = 0
+        self.elapsed = 0.0
+        self._tt = None
+        self._start = 0.0
+
+    # ------------------------------------------------------------ summaries
+
+    def branching_factor(self):
+        # Mean number of children searched per expanded node below the root
+        children = sum(self.nodes[2:])
+        expanded = sum(n - leaves for n, leaves in zip(self.nodes[1:], self.leaves[1:]))
+        return children / expanded if expanded else 0.0
+
+    def effective_branching_factor(self):
+        # Nodes of the last iteration over nodes of the one before it
+        counts = [0] + self.iteration_nodes
+        if len(counts) < 3 or counts[-2] == counts[-3]:
+            return 0.0
+        return (counts[-1] - counts[-2]) / (counts[-2] - counts[-3])
+
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def summary(self):
+        """Multi-line report of the last search."""
+        nps = self.total_nodes / self.elapsed if self.elapsed else 0
+        lines = [f"{self.total_nodes} nodes ({self.qnodes} quiescence) in {self.elapsed:.2f} s, "
+                 f"{nps:.0f} nodes/s",
+                 f"branching factor {self.branching_factor():.2f}, "
+                 f"effective {self.effective_branching_factor():.2f}",
+                 f"transposition table {self.tt_hits}/{self.tt_probes} hits ({self.tt_hit_rate():.0%})"]
+        if self.timings:
+            for name, seconds, calls in (('move generation', self.movegen_time, self.movegen_calls),
+                                         ('legality checks', self.legality_time, self.legality_calls),
+                                         ('evaluation', self.eval_time, self.eval_calls)):
+                share = seconds / self.elapsed if self.elapsed else 0
+                lines.append(f"{name:<16} {seconds:7.3f} s  {share:4.0%}  {calls} calls")
+        lines.append("ply     nodes    leaves   cutoffs")
+        for ply, (nodes, leaves, cutoffs) in enumerate(zip(self.nodes, self.leaves, self.cutoffs)):
+            if nodes:
+                lines.append(f"{ply:>3} {nodes:>9} {leaves:>9} {cutoffs:>9}")
+        return '\n'.join(lines)
+
+    # ----------------------------------------------------------- attaching
+
+    def attach(self, engine):
+        """Start counting engine's search (called by ChessEngine.search)."""
+        self.reset()
+        self._start = time.perf_counter()
+        negamax, quiesce, probe = engine.negamax, engine._quiesce, engine.tt.probe
+        nodes, leaves, cutoffs = self.nodes, self.leaves, self.cutoffs
+        callback, every = self.callback, self.every
+
+        def counted_negamax(depth, alpha, beta):
+            ply = engine.game_ply - engine._root_ply
+            while len(nodes) <= ply:
+                nodes.append(0)
+                leaves.append(0)
+                cutoffs.append(0)
+            nodes[ply] += 1
+            if depth <= 0:
+                leaves[ply] += 1
+            self.total_nodes += 1
+            if callback is not None and not self.total_nodes % every:
+                callback(self)
+            value = negamax(depth, alpha, beta)
+            if value >= beta:
+                cutoffs[ply] += 1
+            return value
+
+        def counted_quiesce(alpha, beta):
+            self.qnodes += 1
+            self.total_nodes += 1
+            if callback is not None and not self.total_nodes % every:
+                callback(self)
+            return quiesce(alpha, beta)
+
+        def counted_probe(key):
+            entry = probe(key)
+            self.tt_probes += 1
+            if entry is not None:
+                self.tt_hits += 1
+            return entry
+
+        engine.negamax = counted_negamax
+        engine._quiesce = counted_quiesce
+        self._tt = engine.tt
+        self._tt.probe = counted_probe
+        if self.timings:
+            self._attach_timers(engine)
+
+    def _attach_timers(self, engine):
+        legal_moves, in_check, evaluate = engine._legal_moves, engine._in_check, engine.evaluate_board
+        clock = time.perf_counter
+
+        def timed_legal_moves(side, captures_only=False):
+            start, legality = clock(), self.legality_time
+            moves = legal_moves(side, captures_only)
+            self.movegen_time += clock() - start - (self.legality_time - legality)
+            self.movegen_calls += 1
+            return moves
+
+        def timed_in_check(side):
+            start = clock()
+            check = in_check(side)
+            self.legality_time += clock() - start
+            self.legality_calls += 1
+            return check
+
+        def timed_evaluate():
+            start = clock()
+            score = evaluate()
+            self.eval_time += clock() - start
+            self.eval_calls += 1
+            return score
+
+        engine._legal_moves = timed_legal_moves
+        engine._in_check = timed_in_check
+        engine.evaluate_board = timed_evaluate
+
+    def end_iteration(self, engine):
+        self.iteration_nodes.append(self.total_nodes)
+
+    def detach(self, engine):
+        """Stop counting: the engine's own methods are used again."""
+        for name in WRAPPED_METHODS:
+            engine.__dict__.pop(name, None)
+        if self._tt is not None:
+            self._tt.__dict__.pop('probe', None)
+            self._tt = None
+        self.elapsed = time.perf_counter() - self._start
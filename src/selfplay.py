@@ -0,0 +1,340 @@
+"""Engine-versus-engine matches on a pool of worker processes.
+
+    python3 -m src.selfplay --first depth=4 --second depth=4,late_move_reductions=0 \\
+        --games 1000 --workers 8 --pgn match.pgn --sprt 0 10
+
+Two engine configurations, first and second, play each opening twice with
+colours reversed.  A configuration is a comma-separated list of settings:
+depth (plies), time (seconds per move), hash (MB) and the search switches
+in FEATURES (0 or 1); give depth, time or both.
+
+Games end in a draw by threefold repetition and the fifty-move rule, and
+are adjudicated by the rules in ADJUDICATION: a win once both sides'
+scores have agreed it is lost for resign_moves moves each, a draw once the
+score has stayed within draw_score for draw_moves moves each after
+draw_after plies, and a draw at max_plies.
+
+Each finished game is appended to the PGN file straight away and the
+running score, Elo estimate and games per minute are printed.  With
+--sprt ELO0 ELO1 the match stops as soon as the sequential probability
+ratio test accepts either hypothesis (first is ELO0 or ELO1 stronger than
+second), instead of playing every game.
+"""
+
+import argparse
+import math
+import multiprocessing
+import sys
+import time
+
+from src.bitboard import parse_square, popcount
+from src.chess_engine import ChessEngine, START_FEN
+from src.notation import move_to_san, parse_epd, parse_san
+
+# Engine attributes a configuration may switch on or off
+FEATURES = ('quiescence', 'null_move_pruning', 'late_move_reductions')
+
+ADJUDICATION = {
+    'max_plies': 300,
+    'resign_score': 800,  # centipawns
+    'resign_moves': 4,
+    'draw_score': 10,
+    'draw_moves': 10,
+    'draw_after': 80,  # plies
+}
+
+# Balanced openings, played from both sides
+OPENINGS = [
+    'e4 e5 Nf3 Nc6 Bb5 a6',
+    'e4 e5 Nf3 Nc6 Bc4 Bc5',
+    'e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3 a6',
+    'e4 c5 Nc3 Nc6 g3 g6',
+    'e4 e6 d4 d5 Nc3 Bb4',
+    'e4 c6 d4 d5 e5 Bf5',
+    'd4 d5 c4 e6 Nc3 Nf6',
+    'd4 d5 c4 c6 Nf3 Nf6',
+    'd4 Nf6 c4 e6 Nc3 Bb4',
+    'd4 Nf6 c4 g6 Nc3 Bg7 e4 d6',
+    'c4 e5 Nc3 Nf6 g3 d5',
+    'Nf3 d5 g3 Nf6 Bg2 c6',
+]
+
+
+def parse_config(text):
+    """Settings dict for a configuration string such as 'depth=4,null_move_pruning=0'."""
+    config = {}
+    for item in filter(None, text.split(',')):
+        name, _, value = item.partition('=')
+        name = name.strip()
+        try:
+            if name in ('depth', 'hash'):
+                config[name] = int(value)
+            elif name == 'time':
+                config[name] = float(value)
+            elif name in FEATURES:
+                config[name] = value.strip() not in ('0', 'false', 'off', 'no')
+            else:
+                raise ValueError(f"Unknown engine setting: {name!r}")
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(str(error)) from None
+    if 'depth' not in config and 'time' not in config:
+        raise argparse.ArgumentTypeError("give a depth, a time or both")
+    return config
+
+
+def _new_engine(config, fen):
+    engine = ChessEngine(config.get('hash', 4))
+    for feature in FEATURES:
+        if feature in config:
+            setattr(engine, feature, config[feature])
+    engine.load_fen(fen)
+    return engine
+
+
+def play_game(fen, white, black, adjudication=None):
+    """Play one game from fen between two configurations.
+
+    Returns (result, termination, san_moves) with result '1-0', '0-1' or
+    '1/2-1/2'.
+    """
+    rules = dict(ADJUDICATION, **(adjudication or {}))
+    engines = _new_engine(white, fen), _new_engine(black, fen)
+    configs = white, black
+    moves, scores = [], []  # scores from White's point of view, one per ply
+    while True:
+        side = engines[0].side
+        engine, config = engines[side], configs[side]
+        color = 'white' if side == 0 else 'black'
+        result = engine.search(color, config.get('depth'), config.get('time'))
+        if result is None:
+            if engine._in_check(side):
+                return ('0-1' if side == 0 else '1-0'), 'checkmate', moves
+            return '1/2-1/2', 'stalemate', moves
+
+        from_x, from_y, to_x, to_y = result.move
+        move = engine._encode(parse_square(from_x, from_y), parse_square(to_x, to_y))
+        moves.append(move_to_san(engine, move))
+        for player in engines:
+            player._make(move)
+        scores.append(result.score if side == 0 else -result.score)
+
+        verdict = _adjudicate(engines[0], scores, rules)
+        if verdict is not None:
+            return verdict + (moves,)
+
+
+def _adjudicate(engine, scores, rules):
+    # (result, termination) once the game can be called, else None
+    if popcount(engine.occupied) == 2:
+        return '1/2-1/2', 'insufficient material'
+    draw = engine.is_draw()
+    if draw:
+        return '1/2-1/2', draw
+    plies = len(scores)
+    window = 2 * rules['resign_moves']
+    if plies >= window:
+        recent = scores[-window:]
+        if all(score >= rules['resign_score'] for score in recent):
+            return '1-0', 'adjudication'
+        if all(score <= -rules['resign_score'] for score in recent):
+            return '0-1', 'adjudication'
+    window = 2 * rules['draw_moves']
+    if plies >= max(window, rules['draw_after']):
+        if all(abs(score) <= rules['draw_score'] for score in scores[-window:]):
+            return '1/2-1/2', 'adjudication'
+    if plies >= rules['max_plies']:
+        return '1/2-1/2', 'move limit'
+    return None
+
+
+def _play_task(task):
+    # Runs in a worker: one game, reported with the task that describes it
+    index, fen, first_is_white, first, second, adjudication = task
+    white, black = (first, second) if first_is_white else (second, first)
+    return task, play_game(fen, white, black, adjudication)
+
+
+# ------------------------------------------------------------------ openings
+
+def opening_positions(path=None):
+    """FEN strings to start games from.
+
+    Without a path, the built-in OPENINGS.  A path names a file with one
+    position per line, as FEN or EPD (EPD operations are ignored).
+    """
+    engine = ChessEngine(hash_mb=1)
+    positions = []
+    if path is None:
+        for line in OPENINGS:
+            engine.load_fen(START_FEN)
+            for san in line.split():
+                engine._make(parse_san(engine, san))
+            positions.append(engine.to_fen())
+        return positions
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            is_fen = len(fields) == 6 and fields[4].isdigit() and fields[5].isdigit()
+            engine.load_fen(line if is_fen else parse_epd(line)[0])
+            positions.append(engine.to_fen())
+    return positions
+
+
+# ------------------------------------------------------------------ statistics
+
+def elo_difference(wins, draws, losses):
+    """Elo difference implied by a score, and its 95% error margin."""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    if score in (0.0, 1.0):
+        return (float('inf') if score else -float('inf')), 0.0
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    low, high = max(score - margin, 1e-6), min(score + margin, 1 - 1e-6)
+    return _elo(score), (_elo(high) - _elo(low)) / 2
+
+
+def _elo(score):
+    return -400 * math.log10(1 / score - 1)
+
+
+def _expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """Log-likelihood ratio of H1 (Elo difference elo1) against H0 (elo0).
+
+    Uses the usual normal approximation of the trinomial (win/draw/loss)
+    model; 0 while every game has had the same result.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance <= 0:
+        return 0.0
+    s0, s1 = _expected_score(elo0), _expected_score(elo1)
+    return games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha=0.05, beta=0.05):
+    """(lower, upper) LLR bounds: below accepts H0, above accepts H1."""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# ------------------------------------------------------------------ match
+
+def run_match(first, second, games, workers=None, openings=None, adjudication=None,
+              sprt=None, pgn=None, out=sys.stderr):
+    """Play up to games games between configurations first and second.
+
+    openings is a list of FEN strings (default: opening_positions()); game
+    2k and 2k + 1 play opening k with first as White and then as Black.
+    sprt is (elo0, elo1[, alpha, beta]); the match ends early once the test
+    decides.  Each game is written to pgn (a text file) as it finishes.
+    Returns (wins, draws, losses) for first.
+    """
+    openings = openings or opening_positions()
+    workers = workers or multiprocessing.cpu_count()
+    tasks = [(index, openings[index // 2 % len(openings)], index % 2 == 0, first, second, adjudication)
+             for index in range(games)]
+    if sprt is not None:
+        elo0, elo1 = sprt[:2]
+        lower, upper = sprt_bounds(*sprt[2:])
+    wins = draws = losses = 0
+    start = time.time()
+
+    context = multiprocessing.get_context()
+    with context.Pool(workers) as pool:
+        for task, (result, termination, moves) in pool.imap_unordered(_play_task, tasks):
+            index, fen, first_is_white = task[:3]
+            if result == '1/2-1/2':
+                draws += 1
+            elif (result == '1-0') == first_is_white:
+                wins += 1
+            else:
+                losses += 1
+            if pgn is not None:
+                pgn.write(_pgn_game(index, fen, first_is_white, result, termination, moves))
+                pgn.flush()
+
+            played = wins + draws + losses
+            minutes = (time.time() - start) / 60
+            elo, margin = elo_difference(wins, draws, losses)
+            line = (f"game {played}/{games}: +{wins} ={draws} -{losses}  "
+                    f"elo {elo:+.1f} +/- {margin:.1f}  {played / minutes:.1f} games/min")
+            if sprt is not None:
+                llr = sprt_llr(wins, draws, losses, elo0, elo1)
+                line += f"  llr {llr:.2f} ({lower:.2f}, {upper:.2f})"
+            print(line, file=out, flush=True)
+            if sprt is not None and not lower < llr < upper:
+                print(f"SPRT: H{'1' if llr >= upper else '0'} accepted "
+                      f"(elo {elo1 if llr >= upper else elo0})", file=out)
+                pool.terminate()
+                break
+    return wins, draws, losses
+
+
+def _pgn_game(index, fen, first_is_white, result, termination, moves):
+    names = ('first', 'second') if first_is_white else ('second', 'first')
+    tags = [('Event', 'Self-play match'), ('Round', str(index + 1)), ('White', names[0]),
+            ('Black', names[1]), ('Result', result), ('Termination', termination)]
+    if fen != START_FEN:
+        tags += [('SetUp', '1'), ('FEN', fen)]
+    text = ''.join(f'[{name} "{value}"]\n' for name, value in tags) + '\n'
+    fullmove, black_first = int(fen.split()[5]), fen.split()[1] == 'b'
+    words = [f"{fullmove}..."] if black_first and moves else []
+    for ply, san in enumerate(moves, start=black_first):
+        if ply % 2 == 0:
+            words.append(f"{fullmove + ply // 2}.")
+        words.append(san)
+    words.append(result)
+    lines, line = [], ''
+    for word in words:  # PGN lines stay under 80 characters
+        if len(line) + len(word) >= 80:
+            lines.append(line)
+            line = ''
+        line = f"{line} {word}" if line else word
+    return text + '\n'.join(lines + [line]) + '\n\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play two engine configurations against each other")
+    parser.add_argument("--first", type=parse_config, default=parse_config('depth=3'),
+                        help="first engine settings, e.g. depth=4,null_move_pruning=0 (default depth=3)")
+    parser.add_argument("--second", type=parse_config, default=parse_config('depth=3'),
+                        help="second engine settings (default depth=3)")
+    parser.add_argument("--games", type=int, default=100, help="games to play at most (default 100)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--openings", help="FEN or EPD file of start positions (default: built in)")
+    parser.add_argument("--pgn", help="file the games are appended to")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help="stop once an SPRT (alpha = beta = 0.05) accepts ELO0 or ELO1")
+    for name, default in ADJUDICATION.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default,
+                            help=f"adjudication: {name} (default {default})")
+    args = parser.parse_args(argv)
+
+    adjudication = {name: getattr(args, name) for name in ADJUDICATION}
+    pgn = open(args.pgn, 'a', encoding='utf-8') if args.pgn else None
+    try:
+        wins, draws, losses = run_match(args.first, args.second, args.games, args.workers,
+                                        opening_positions(args.openings), adjudication,
+                                        args.sprt, pgn)
+    finally:
+        if pgn is not None:
+            pgn.close()
+    elo, margin = elo_difference(wins, draws, losses)
+    print(f"first vs second: +{wins} ={draws} -{losses}, elo {elo:+.1f} +/- {margin:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,459 @@
+"""Distance-to-mate endgame tablebases for few-piece endings.
+
+A table covers one material signature such as ``KQvK`` (White's pieces,
+'v', Black's pieces) and holds one signed byte per position:
+
+    0     draw (or an impossible position)
+    +n    the side to move mates in n - 1 plies
+    -n    the side to move is mated in n - 1 plies (-1: checkmated now)
+
+Positions are indexed directly from the piece squares, so a probe is a
+few multiplications and one byte read.  The board is first turned so that
+the white king stands on a1-d1-d4 (a1-d8 when there are pawns, which only
+allow the left-right mirror); the index is then
+
+    ((side * KING_SQUARES + white king) * 64 + black king) * 64 + ...
+
+over the remaining pieces in signature order.  Tables for the other
+colour (``KvKQ``) are probed by flipping the board.
+
+Tables are built offline by retrograde analysis over the engine's own move
+generator, which also means they follow its rules (promotion is always to
+a queen):
+
+    python3 -m src.tablebase --out assets/tablebases            # KQvK KRvK KPvK
+    python3 -m src.tablebase --out assets/tablebases KQvKR
+
+Three-piece tables take seconds.  Four-piece tables work the same way but
+need a few minutes and several hundred MB each; the smaller tables they
+convert into (after a capture or promotion) are generated first.
+
+The file format is a header '<4s12sI' (magic b'PGTB', signature, number
+of positions) followed by the values as signed bytes; files are
+memory-mapped when loaded.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from src.bitboard import WHITE, KING_ATTACKS, lsb, popcount
+from src.chess_engine import ChessEngine, MATE_SCORE
+from src.moves import FLAG_MASK, PROMOTION
+
+HEADER = struct.Struct('<4s12sI')
+MAGIC = b'PGTB'
+DEFAULT_TABLES = ['KQvK', 'KRvK', 'KPvK']
+
+PIECE_LETTERS = 'PNBRQK'  # index + 1 = piece kind
+SIGNATURE_ORDER = [5, 4, 3, 2, 1]  # non-king pieces: Q, R, B, N, P
+
+
+# ------------------------------------------------------------------ symmetry
+
+def _transform(sq, t):
+    # t bit 0: mirror files, bit 1: mirror ranks, bit 2: swap files and ranks
+    x, y = sq & 7, sq >> 3
+    if t & 1:
+        x = 7 - x
+    if t & 2:
+        y = 7 - y
+    if t & 4:
+        x, y = y, x
+    return y * 8 + x
+
+
+TRANSFORMS = [[_transform(sq, t) for sq in range(64)] for t in range(8)]
+
+
+def _king_tables(pawns):
+    # KING_TRANSFORM[sq]: symmetry that brings a white king on sq into the
+    # canonical region; KING_INDEX[sq]: position of sq within that region
+    transforms = [0, 1] if pawns else range(8)
+    if pawns:
+        region = [sq for sq in range(64) if sq & 7 < 4]
+    else:
+        region = [sq for sq in range(64) if sq & 7 < 4 and sq >> 3 <= sq & 7]
+    king_transform = [next(t for t in transforms if TRANSFORMS[t][sq] in region) for sq in range(64)]
+    king_index = [0] * 64
+    for i, sq in enumerate(region):
+        king_index[sq] = i
+    return region, king_transform, king_index
+
+
+PAWNLESS = _king_tables(False)
+WITH_PAWNS = _king_tables(True)
+
+
+def signature_pieces(signature):
+    """'KQvKR' -> [6, -6, 5, -4]: kings first, then the other pieces in order."""
+    white, black = signature.upper().split('V')
+    if white[:1] != 'K' or black[:1] != 'K':
+        raise ValueError(f"Invalid tablebase signature: {signature!r}")
+    pieces = [6, -6]
+    pieces += [PIECE_LETTERS.index(c) + 1 for c in white[1:]]
+    pieces += [-(PIECE_LETTERS.index(c) + 1) for c in black[1:]]
+    return pieces
+
+
+def _material_signature(counts):
+    # counts[piece] for piece codes -6..6 (indexed like bitboards)
+    parts = []
+    for sign in (1, -1):
+        parts.append('K' + ''.join(PIECE_LETTERS[kind - 1] * counts[sign * kind] for kind in SIGNATURE_ORDER))
+    return parts[0] + 'v' + parts[1]
+
+
+class Table:
+    """One signature's values plus its indexing scheme."""
+
+    def __init__(self, signature, values):
+        self.signature = signature
+        self.pieces = signature_pieces(signature)
+        self.pawns = 1 in self.pieces or -1 in self.pieces
+        self.region, self.king_transform, self.king_index = WITH_PAWNS if self.pawns else PAWNLESS
+        self.size = 2 * len(self.region) * 64 ** (len(self.pieces) - 1)
+        self.values = values
+
+    def index(self, squares, side):
+        """Index of the position with the pieces on squares (in self.pieces order)."""
+        t = TRANSFORMS[self.king_transform[squares[0]]]
+        index = side * len(self.region) + self.king_index[t[squares[0]]]
+        for sq in squares[1:]:
+            index = index * 64 + t[sq]
+        return index
+
+    def position(self, index):
+        """Inverse of index: (squares, side)."""
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            index, sq = divmod(index, 64)
+            squares.append(sq)
+        side, king = divmod(index, len(self.region))
+        squares.append(self.region[king])
+        return squares[::-1], side
+
+
+def _squares_in_order(bitboards, pieces):
+    # Piece squares in signature order; equal pieces take ascending squares
+    squares = []
+    seen = {}
+    for piece in pieces:
+        bb = bitboards[piece]
+        for _ in range(seen.get(piece, 0)):
+            bb &= bb - 1
+        seen[piece] = seen.get(piece, 0) + 1
+        squares.append(lsb(bb))
+    return squares
+
+
+# Tablebases opened in this process, by directory
+_opened = {}
+
+
+def _open(directory):
+    # The tablebases of directory, opened once per process
+    tablebases = _opened.get(directory)
+    return tablebases if tablebases is not None else Tablebases(directory)
+
+
+class Tablebases:
+    """The tables found in a directory, probed by ChessEngine.
+
+    Set ``engine.tablebases = Tablebases(directory)`` and the search scores
+    covered positions from the tables, and choose_best_move plays the
+    table's best move at the root.
+    """
+
+    def __init__(self, directory=None, tables=None):
+        self.directory = directory
+        self.tables = dict(tables or {})
+        if directory is not None:
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.tb'):
+                    table = load_table(os.path.join(directory, name))
+                    self.tables[table.signature] = table
+            if not tables:
+                _opened[directory] = self
+        self.max_pieces = max((len(table.pieces) for table in self.tables.values()), default=0)
+
+    def __deepcopy__(self, memo):
+        # The tables are read-only, so copies (the GUI's searcher) share them
+        return self
+
+    def __reduce__(self):
+        # A pickled copy (each parallel search task carries one) maps the
+        # files once per process; tables built in memory travel as arrays
+        if self.directory is None:
+            return Tablebases, (None, {sig: Table(sig, array('b', t.values))
+                                       for sig, t in self.tables.items()})
+        return _open, (self.directory,)
+
+    def probe(self, engine):
+        """Table value (see the module docstring) for engine's position, or None."""
+        if engine.castling:
+            return None
+        if engine.ep_square is not None and engine.bitboards[1 if engine.side == WHITE else -1]:
+            return None  # the tables never allow en passant
+        bbs = engine.bitboards
+        counts = [popcount(bb) for bb in bbs]
+        if counts[6] != 1 or counts[-6] != 1:
+            return None
+        if sum(counts) == 2:
+            return 0  # bare kings
+        signature = _material_signature(counts)
+        table = self.tables.get(signature)
+        side = engine.side
+        if table is None:
+            white, black = signature.split('v')
+            table = self.tables.get(black + 'v' + white)
+            if table is None:
+                return None
+            # Probe the colour-flipped position
+            bbs = [0] * 13
+            for piece in range(-6, 7):
+                bb = engine.bitboards[piece]
+                while bb:
+                    low = bb & -bb
+                    bbs[-piece] |= 1 << (lsb(low) ^ 56)
+                    bb ^= low
+            side ^= 1
+        return table.values[table.index(_squares_in_order(bbs, table.pieces), side)]
+
+    def score(self, value, ply):
+        """Search score (for the side to move) of a table value at ply."""
+        if value > 0:
+            return MATE_SCORE - (ply + value - 1)
+        if value < 0:
+            return -(MATE_SCORE - (ply - value - 1))
+        return 0
+
+    def best_move(self, engine):
+        """The table's best move for the side to move, or None.
+
+        Wins take the fastest mate, losses the slowest; None when some
+        move leads outside the loaded tables.
+        """
+        if self.probe(engine) is None:
+            return None
+        best_move, best_key = None, None
+        for move in engine._legal_moves(engine.side):
+            engine._make(move)
+            value = self.probe(engine)
+            engine.undo_move()
+            if value is None:
+                return None
+            # Rank from the mover's side: quick wins, then draws, then slow losses
+            if value < 0:
+                key = (2, value)       # opponent mated: fewer plies is better
+            elif value == 0:
+                key = (1, 0)
+            else:
+                key = (0, value)       # opponent mates: more plies is better
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move
+
+
+def load_table(path):
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, signature, size = HEADER.unpack_from(data, 0)
+    signature = signature.rstrip(b'\0').decode('ascii')
+    table = Table(signature, None)
+    if magic != MAGIC or size != table.size or len(data) != HEADER.size + size:
+        data.close()
+        raise ValueError(f"{path} is not a valid tablebase file")
+    table.values = memoryview(data)[HEADER.size:].cast('b')
+    return table
+
+
+def save_table(table, directory):
+    path = os.path.join(directory, table.signature + '.tb')
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, table.signature.encode('ascii'), table.size))
+        f.write(bytes(table.values))
+    return path
+
+
+# ------------------------------------------------------------------ generation
+
+def _subsignatures(pieces):
+    # Signatures reachable by one capture, promotion or capturing promotion
+    # (kings are never captured, pawns always promote to a queen)
+    results = []
+    for i, piece in enumerate(pieces[2:], start=2):
+        rest = pieces[:i] + pieces[i + 1:]
+        results.append(rest)
+        if piece == 1 or piece == -1:
+            queen = 5 if piece > 0 else -5
+            results.append(rest + [queen])
+            for j, victim in enumerate(rest[2:], start=2):
+                if (victim > 0) != (piece > 0):
+                    results.append(rest[:j] + rest[j + 1:] + [queen])
+    signatures = set()
+    for rest in results:
+        counts = [0] * 13
+        for piece in rest:
+            counts[piece] += 1
+        if len(rest) > 2:
+            signatures.add(_material_signature(counts))
+    return signatures
+
+
+def generate(signature, tablebases=None, log=None):
+    """Build the table for signature by retrograde analysis.
+
+    tablebases must hold (or will be given) the tables of every ending a
+    capture or promotion leads to; missing ones are generated first.
+    Returns the new Table, also added to tablebases.
+    """
+    if tablebases is None:
+        tablebases = Tablebases()
+    for sub in sorted(_subsignatures(signature_pieces(signature))):
+        white, black = sub.split('v')
+        if sub not in tablebases.tables and black + 'v' + white not in tablebases.tables:
+            generate(sub, tablebases, log)
+
+    start = time.time()
+    table = Table(signature, None)
+    pieces = table.pieces
+    size = table.size
+    engine = ChessEngine(hash_mb=1)
+    engine.castling = 0
+    engine.ep_square = None
+
+    values = array('b', bytes(size))
+    valid = bytearray(size)
+    child_start = array('I', [0]) * (size + 1)
+    children = array('I')
+    remaining = array('H', bytes(2 * size))
+    events = {}  # level -> [(position, child lost?)]
+
+    def add_event(level, position, lost):
+        events.setdefault(level, []).append((position, lost))
+
+    # Forward pass: every legal position's successors within the table, and
+    # the already-known values of successors outside it
+    for index in range(size):
+        child_start[index] = len(children)
+        squares, side = table.position(index)
+        if len(set(squares)) != len(squares) or KING_ATTACKS[squares[0]] & 1 << squares[1]:
+            continue
+        if any((piece == 1 or piece == -1) and (sq < 8 or sq >= 56) for piece, sq in zip(pieces, squares)):
+            continue
+        board = [0] * 64
+        for piece, sq in zip(pieces, squares):
+            board[sq] = piece
+        engine.side = side
+        engine.game_ply = 0
+        engine._load_squares(board)
+        if engine._in_check(side ^ 1):
+            continue  # the side that just moved left its king in check
+        valid[index] = 1
+        moves = engine._legal_moves(side)
+        if not moves:
+            if engine._in_check(side):
+                values[index] = -1
+                add_event(0, index, None)
+            continue  # stalemate stays a draw
+        edges = 0
+        drawn = False
+        slots = {sq: i for i, sq in enumerate(squares)}
+        for move in moves:
+            frm, to = move & 63, move >> 6 & 63
+            if engine.squares[to] or move & FLAG_MASK == PROMOTION:
+                # Leaves this table: look the result up in the smaller one
+                engine._make(move)
+                value = tablebases.probe(engine)
+                engine.undo_move()
+                if value < 0:
+                    add_event(-value - 1, index, True)
+                    edges += 1
+                elif value > 0:
+                    add_event(value - 1, index, False)
+                    edges += 1
+                else:
+                    drawn = True  # this position is never lost
+            else:
+                child = squares[:]
+                child[slots[frm]] = to
+                children.append(table.index(child, side ^ 1))
+                edges += 1
+        remaining[index] = 0xFFFF if drawn else edges
+    child_start[size] = len(children)
+
+    # Reverse edges
+    parent_start = array('I', [0]) * (size + 1)
+    for child in children:
+        parent_start[child + 1] += 1
+    for i in range(size):
+        parent_start[i + 1] += parent_start[i]
+    parents = array('I', [0]) * len(children)
+    fill = array('I', parent_start[:size])
+    for index in range(size):
+        for child in children[child_start[index]:child_start[index + 1]]:
+            parents[fill[child]] = index
+            fill[child] += 1
+
+    # Retrograde pass, one distance at a time: a position is won one ply
+    # after its first lost successor appears, and lost one ply after its
+    # last successor turns out to be won
+    level = 0
+    while events and level < 126:
+        for position, lost in events.pop(level, ()):
+            if lost is None:  # position itself resolved at this level
+                resolved = position
+                for parent in parents[parent_start[resolved]:parent_start[resolved + 1]]:
+                    _propagate(parent, values[resolved] < 0, level, values, remaining, add_event)
+            else:
+                _propagate(position, lost, level, values, remaining, add_event)
+        level += 1
+
+    table.values = values
+    tablebases.tables[signature] = table
+    tablebases.max_pieces = max(tablebases.max_pieces, len(pieces))
+    if log is not None:
+        print(f"{signature}: {sum(valid)} positions, {sum(1 for v in values if v > 0)} won, "
+              f"{sum(1 for v in values if v < 0)} lost, longest mate {max(values) - 1} plies, "
+              f"{time.time() - start:.1f} s", file=log)
+    return table
+
+
+def _propagate(parent, child_lost, level, values, remaining, add_event):
+    # A successor of parent was resolved at level (its distance to mate)
+    if values[parent]:
+        return
+    if child_lost:
+        values[parent] = level + 2
+        add_event(level + 1, parent, None)
+    else:
+        remaining[parent] -= 1
+        if not remaining[parent]:
+            values[parent] = -(level + 2)
+            add_event(level + 1, parent, None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases")
+    parser.add_argument("signatures", nargs='*', default=DEFAULT_TABLES,
+                        help=f"endings to build, e.g. KQvKR (default {' '.join(DEFAULT_TABLES)})")
+    parser.add_argument("--out", default="assets/tablebases", help="output directory")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    tablebases = Tablebases(args.out)
+    for signature in args.signatures:
+        generate(signature, tablebases, log=sys.stdout)
+    for table in tablebases.tables.values():
+        if isinstance(table.values, array):  # newly generated
+            print(f"wrote {save_table(table, args.out)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
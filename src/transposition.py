@@ -0,0 +1,57 @@
+from array import array
+
+# Bound types stored with each score
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by Zobrist hash.
+
+    Entries live in three flat arrays (key, score, packed depth/bound/move/
+    generation), 20 bytes each, so memory stays at the configured size no
+    matter how long a session runs.  A slot is overwritten when it holds the
+    same position, was written by an earlier search, or holds a result that
+    was searched no deeper than the new one.
+    """
+
+    ENTRY_BYTES = 20
+
+    def __init__(self, size_mb=16):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        entries = max(1, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1)  # round down to a power of two
+        self.mask = self.size - 1
+        self.clear()
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.size))
+        self.scores = array('d', bytes(8 * self.size))
+        # bits 0-15 move, 16-23 depth, 24-25 bound, 26-31 generation
+        self.data = array('I', bytes(4 * self.size))
+        self.generation = 0
+
+    def new_search(self):
+        # Entries from older searches become the first to be replaced
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key):
+        """Return (depth, bound, score, move) for key, or None."""
+        index = key & self.mask
+        if self.keys[index] != key:
+            return None
+        data = self.data[index]
+        return (data >> 16) & 0xFF, (data >> 24) & 3, self.scores[index], data & 0xFFFF
+
+    def store(self, key, depth, bound, score, move):
+        index = key & self.mask
+        if self.keys[index] != key:
+            data = self.data[index]
+            if data >> 26 == self.generation and (data >> 16) & 0xFF > depth and self.keys[index]:
+                return
+        elif not move:
+            move = self.data[index] & 0xFFFF  # keep the old best move
+        self.keys[index] = key
+        self.scores[index] = score
+        self.data[index] = move | depth << 16 | bound << 24 | self.generation << 26
@@ -0,0 +1,231 @@
+"""UCI front end, for tournament managers and analysis GUIs.
+
+    python3 -m src.uci
+
+Supported commands: uci, isready, ucinewgame, setoption (Hash, Threads),
+position (startpos or fen, with moves), go (depth, movetime, wtime/btime/
+winc/binc/movestogo, infinite), stop and quit.
+
+Commands are read on the main thread while the search runs on its own, so
+isready is answered and stop takes effect at once.  Every completed
+iteration is reported as an info line (depth, score, nodes, nps, time, pv).
+"""
+
+import sys
+import threading
+import time
+
+from src.bitboard import parse_square
+from src.chess_engine import ChessEngine, MATE_BOUND, MATE_SCORE, MAX_DEPTH, START_FEN
+from src.move_ordering import MoveOrderer
+from src.notation import move_to_uci, parse_uci
+
+NAME = "PyGambit"
+AUTHOR = "the PyGambit authors"
+DEFAULT_HASH = 16
+MAX_HASH = 1024
+MAX_THREADS = 64
+MOVES_TO_GO = 30  # assumed moves left when the clock has no movestogo
+MOVE_OVERHEAD = 0.05  # seconds kept back per move for I/O and the GUI
+
+
+class UCIEngine:
+    """A ChessEngine driven by UCI commands.
+
+    handle() takes one command line and writes replies to out; it returns
+    False after quit.  go starts the search on a background thread, which
+    writes the info and bestmove lines itself.
+    """
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.engine = ChessEngine(DEFAULT_HASH)
+        self._lock = threading.Lock()  # one writer at a time on out
+        self._thread = None
+        self._stop = threading.Event()
+        self._infinite = False
+
+    def _send(self, line):
+        with self._lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def handle(self, line):
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == 'uci':
+            self._send(f"id name {NAME}")
+            self._send(f"id author {AUTHOR}")
+            self._send(f"option name Hash type spin default {DEFAULT_HASH} min 1 max {MAX_HASH}")
+            self._send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self._send("uciok")
+        elif command == 'isready':
+            self._send("readyok")
+        elif command == 'ucinewgame':
+            self.stop()
+            self.engine.tt.clear()
+            self.engine.orderer = MoveOrderer()
+        elif command == 'setoption':
+            self.stop()
+            self._set_option(args)
+        elif command == 'position':
+            self.stop()
+            self._set_position(args)
+        elif command == 'go':
+            self.stop()
+            self._go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            self.stop()
+            return False
+        else:
+            self._send(f"info string unknown command: {line.strip()}")
+        return True
+
+    def stop(self):
+        """Stop a running search and wait for its bestmove line."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def wait(self):
+        """Wait for a running search to finish (an infinite one is stopped)."""
+        if self._thread is not None:
+            if self._infinite:
+                self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _set_option(self, args):
+        # setoption name <id> [value <x>]
+        text = ' '.join(args)
+        name, _, value = text.partition(' value ')
+        name = name.replace('name', '', 1).strip().lower()
+        try:
+            if name == 'hash':
+                self.engine.tt.resize(min(max(int(value), 1), MAX_HASH))
+            elif name == 'threads':
+                self.engine.workers = min(max(int(value), 1), MAX_THREADS)
+            else:
+                self._send(f"info string unknown option: {name}")
+        except ValueError:
+            self._send(f"info string invalid value for {name}: {value.strip()}")
+
+    def _set_position(self, args):
+        # position (startpos | fen <fields>) [moves <m1> <m2> ...]
+        if 'moves' in args:
+            split = args.index('moves')
+            args, moves = args[:split], args[split + 1:]
+        else:
+            moves = []
+        engine = self.engine
+        try:
+            if args[:1] == ['startpos']:
+                engine.load_fen(START_FEN)
+            elif args[:1] == ['fen']:
+                engine.load_fen(' '.join(args[1:]))
+            else:
+                raise ValueError(f"Invalid position command: {' '.join(args)!r}")
+            for text in moves:
+                engine._make(parse_uci(engine, text))
+        except ValueError as error:
+            self._send(f"info string {error}")
+
+    def _go(self, args):
+        options = {}
+        for index, word in enumerate(args):
+            if word in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo'):
+                try:
+                    options[word] = int(args[index + 1])
+                except (IndexError, ValueError):
+                    self._send(f"info string invalid value for {word}")
+                    return
+        depth = options.get('depth')
+        time_limit = None
+        if 'movetime' in options:
+            time_limit = max(options['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+        elif 'wtime' in options or 'btime' in options:
+            time_limit = self._allot_time(options)
+        # Plain go searches until stop, like go infinite
+        self._infinite = 'infinite' in args or (depth is None and time_limit is None)
+        if self._infinite:
+            time_limit = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._search, args=(depth or MAX_DEPTH, time_limit),
+                                        daemon=True)
+        self._thread.start()
+
+    def _allot_time(self, options):
+        # A share of the remaining clock plus most of the increment, never
+        # more than a third of what is left
+        white = self.engine.side == 0
+        remaining = options.get('wtime' if white else 'btime', 0) / 1000
+        increment = options.get('winc' if white else 'binc', 0) / 1000
+        moves_to_go = options.get('movestogo') or MOVES_TO_GO
+        budget = remaining / moves_to_go + increment * 0.8
+        return max(min(budget, remaining / 3) - MOVE_OVERHEAD, 0.01)
+
+    def _search(self, depth, time_limit):
+        engine = self.engine
+        color = 'white' if engine.side == 0 else 'black'
+        start = time.time()
+        result = engine.search(color, depth, time_limit, stop=self._stop,
+                               report=lambda result: self._send(self._info(result, start)))
+        if result is not None and not result.depth:  # book or tablebase move
+            self._send(self._info(result, start))
+        if self._infinite:
+            self._stop.wait()  # the bestmove waits for stop, even after a mate is found
+
+        if result is None:
+            moves = engine._legal_moves(engine.side)
+            # Stopped before the first iteration: any legal move will do
+            self._send(f"bestmove {move_to_uci(moves[0])}" if moves else "bestmove 0000")
+            return
+        pv = self._pv_moves(result.pv)
+        line = f"bestmove {move_to_uci(pv[0])}"
+        if len(pv) > 1:
+            line += f" ponder {move_to_uci(pv[1])}"
+        self._send(line)
+
+    def _info(self, result, start):
+        elapsed = max(time.time() - start, 0.001)
+        nodes = result.nodes + result.qnodes
+        score = result.score
+        if abs(score) > MATE_BOUND:
+            mate = (MATE_SCORE - abs(score) + 1) // 2
+            score_text = f"mate {mate if score > 0 else -mate}"
+        else:
+            score_text = f"cp {int(score)}"
+        pv = ' '.join(move_to_uci(move) for move in self._pv_moves(result.pv))
+        return (f"info depth {result.depth} score {score_text} nodes {nodes} "
+                f"nps {int(nodes / elapsed)} time {int(elapsed * 1000)} pv {pv}")
+
+    def _pv_moves(self, names):
+        # Packed moves for a line of ('e', 2, 'e', 4) tuples from the root,
+        # played through so promotions and castling get their flags
+        engine = self.engine
+        moves = []
+        for from_x, from_y, to_x, to_y in names:
+            move = engine._encode(parse_square(from_x, from_y), parse_square(to_x, to_y))
+            moves.append(move)
+            engine._make(move)
+        for _ in moves:
+            engine.undo_move()
+        return moves
+
+
+def main():
+    uci = UCIEngine()
+    for line in sys.stdin:
+        if not uci.handle(line):
+            return 0
+    uci.wait()  # end of input: let a running search finish
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
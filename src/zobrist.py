@@ -0,0 +1,22 @@
+# Zobrist keys for hashing ChessEngine positions.
+#
+# The keys come from a fixed seed so a position hashes to the same value in
+# every process and every run -- search workers and on-disk tables rely on it.
+
+import random
+
+_rng = random.Random(0x9E3779B97F4A7C15)
+
+
+def _key():
+    return _rng.getrandbits(64)
+
+
+# PIECE_KEYS[piece][sq] for piece in -6..6, laid out like ChessEngine.bitboards
+# (negative codes wrap to the end of the list; slot 0 is never used)
+PIECE_KEYS = [[_key() for _ in range(64)] for _ in range(13)]
+SIDE_KEY = _key()  # XORed in when black is to move
+# One key per castling-rights mask (bit 0: white kingside, 1: white queenside,
+# 2: black kingside, 3: black queenside)
+CASTLING_KEYS = [0] + [_key() for _ in range(15)]
+EN_PASSANT_KEYS = [_key() for _ in range(8)]  # indexed by file
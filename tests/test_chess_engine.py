@@ -1,6 +1,28 @@
 # test_chess_engine.py
 
-from src.chess_engine import ChessEngine
+import copy
+import io
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from src.analyze import analyze_stream
+from src.book import OpeningBook, build_book
+from src.chess_engine import (ChessEngine, MATE_BOUND, PIECE_VALUES, START_FEN, SearchResult,
+                               evaluate_boards)
+from src.chess_gui import ChessGUI
+from src.moves import CASTLING, EN_PASSANT, FLAG_MASK, PROMOTION, QUEEN_PROMOTION, encode_move, move_name
+from src.notation import format_epd, move_to_san, move_to_uci, parse_epd, parse_san, parse_uci
+from src.perft import POSITIONS
+from src.search_stats import SearchStats
+from src.selfplay import parse_config, play_game, run_match, sprt_bounds, sprt_llr
+from src.tablebase import Tablebases, generate, save_table
+from src.uci import UCIEngine
+from src import parallel
 
 def test_initial_board():
     engine = ChessEngine()
@@ -123,6 +145,566 @@ def test_ai_move():
     print("\nBoard after AI move:")
     engine.print_board()
 
+def test_board_edits_update_bitboards():
+    engine = ChessEngine()
+    engine.board[1, 4] = 0  # Remove pawn at e2
+    # The bishop on f1 now sees the opened diagonal
+    assert ('a', 6) in engine.get_moves('f', 1)
+    engine.make_move('f', 1, 'b', 5)
+    assert engine.board[4, 1] == 3 and engine.board[0, 5] == 0
+    engine.undo_move()
+    assert engine.board[0, 5] == 3
+
+def test_zobrist_hash_incremental():
+    engine = ChessEngine()
+    start_key = engine.hash_key
+    for move in [('e', 2, 'e', 4), ('d', 7, 'd', 5), ('e', 4, 'd', 5), ('g', 8, 'f', 6)]:
+        engine.make_move(*move)
+        assert engine.hash_key == engine._compute_hash()
+    for _ in range(4):
+        engine.undo_move()
+    assert engine.hash_key == start_key
+
+    # The same position reached by a different move order hashes the same
+    a, b = ChessEngine(), ChessEngine()
+    for move in [('g', 1, 'f', 3), ('g', 8, 'f', 6), ('b', 1, 'c', 3)]:
+        a.make_move(*move)
+    for move in [('b', 1, 'c', 3), ('g', 8, 'f', 6), ('g', 1, 'f', 3)]:
+        b.make_move(*move)
+    assert a.hash_key == b.hash_key
+
+def test_transposition_table_size():
+    engine = ChessEngine(hash_mb=1)
+    assert engine.tt.size * engine.tt.ENTRY_BYTES <= 1024 * 1024
+    engine.choose_best_move('white', 2)
+    assert engine.tt.probe(engine.hash_key) is not None
+
+def test_time_limited_search():
+    engine = ChessEngine()
+    start = time.time()
+    best_move = engine.choose_best_move('white', time_limit=0.5)
+    assert time.time() - start < 2.0
+    assert best_move in engine.get_all_moves('white')
+    assert len(engine.move_history) == 0  # the interrupted iteration was unwound
+    print("\nTime-limited best move for white:", best_move)
+
+def test_move_ordering():
+    engine = ChessEngine()
+    for move in [('e', 2, 'e', 4), ('d', 7, 'd', 5)]:
+        engine.make_move(*move)
+    moves = engine.orderer.order(engine._legal_moves(0), engine.squares, 0, 0)
+    # The only capture (exd5) is searched first
+    assert move_name(moves[0]) == ('e', 4, 'd', 5)
+
+    engine.choose_best_move('white', 3)
+    print("\nFirst-move cutoff rate:", engine.orderer.first_move_cutoff_rate())
+    assert engine.orderer.cutoffs > 0
+
+def test_square_attacks():
+    engine = ChessEngine()
+    assert engine.is_square_attacked('f', 3, 'white')      # pawns and knight
+    assert not engine.is_square_attacked('e', 4, 'white')
+    assert engine.is_square_attacked('f', 6, 'black')
+    engine.make_move('e', 2, 'e', 4)
+    engine.make_move('f', 7, 'f', 6)
+    engine.make_move('d', 1, 'h', 5)                       # queen checks along the diagonal
+    assert engine.is_in_check('black')
+    assert engine.king_squares == [4, 60]
+    engine.make_move('e', 8, 'f', 7)
+    assert engine.king_squares[1] == 53
+    engine.undo_move()
+    assert engine.king_squares[1] == 60
+
+def _reference_legal_moves(engine, side):
+    # The original legality test: make each pseudo-legal move and look for check
+    legal = []
+    for move in engine._pseudo_moves(side):
+        engine._make(move)
+        if not engine._in_check(side):
+            legal.append(move)
+        engine.undo_move()
+    return legal
+
+def _compare_generators(engine, side, depth):
+    moves = engine._legal_moves(side)
+    assert sorted(moves) == sorted(_reference_legal_moves(engine, side))
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        engine._make(move)
+        nodes += _compare_generators(engine, side ^ 1, depth - 1)
+        engine.undo_move()
+    return nodes
+
+def test_legal_generator_matches_reference():
+    engine = ChessEngine()
+    assert _compare_generators(engine, 0, 3) == 8902
+
+    # Pins, en passant and a check to evade
+    for move in [('e', 2, 'e', 4), ('d', 7, 'd', 5), ('e', 4, 'e', 5), ('f', 7, 'f', 5),
+                 ('d', 1, 'h', 5), ('g', 7, 'g', 6), ('f', 1, 'b', 5)]:
+        engine.make_move(*move)
+    assert engine.is_in_check('black')
+    _compare_generators(engine, 1, 3)
+
+def test_incremental_evaluation():
+    engine = ChessEngine()
+    assert engine.evaluate_board() == 0
+    for move in [('e', 2, 'e', 4), ('d', 7, 'd', 5), ('e', 4, 'd', 5), ('d', 8, 'd', 5)]:
+        engine.make_move(*move)
+        # Same score as a full material + centre scan
+        assert engine.evaluate_board() == sum(
+            (PIECE_VALUES[abs(p)] + (10 if 2 <= x <= 5 and 2 <= y <= 5 else 0)) * (1 if p > 0 else -1)
+            for y in range(8) for x in range(8) for p in [engine.board[y, x]] if p != 0)
+    engine.undo_move()
+    assert engine.evaluate_board() == 110  # a pawn up after exd5, and it stands in the centre
+
+def test_mate_found_by_search():
+    engine = ChessEngine()
+    engine.make_move('f', 2, 'f', 3)
+    engine.make_move('e', 7, 'e', 5)
+    engine.make_move('g', 2, 'g', 4)
+    # Fool's mate is found even at depth 1
+    assert engine.choose_best_move('black', 1) == ('d', 8, 'h', 4)
+
+def test_batch_evaluation():
+    engines = [ChessEngine() for _ in range(3)]
+    engines[1].make_move('e', 2, 'e', 4)
+    engines[2].make_move('e', 2, 'e', 4)
+    engines[2].make_move('d', 7, 'd', 5)
+    engines[2].make_move('e', 4, 'd', 5)
+    boards = np.stack([engine.board for engine in engines])
+    assert list(evaluate_boards(boards)) == [engine.evaluate_board() for engine in engines]
+
+    # Batched frontier scoring gives the same minimax value
+    plain, batched = ChessEngine(), ChessEngine()
+    batched.batch_frontier = True
+    for engine in (plain, batched):
+        engine.quiescence = False
+        engine.make_move('e', 2, 'e', 4)
+        engine.make_move('d', 7, 'd', 5)
+    assert plain.minimax(3, -float('inf'), float('inf'), True) == \
+        batched.minimax(3, -float('inf'), float('inf'), True)
+
+    # ... and the same search, principal variation included
+    for _, fen, _ in POSITIONS[:4]:
+        found = []
+        for engine in (ChessEngine(hash_mb=1), ChessEngine(hash_mb=1)):
+            engine.load_fen(fen)
+            engine.quiescence = False
+            engine.batch_frontier = bool(found)
+            result = engine.search('white' if engine.side == 0 else 'black', 3)
+            found.append((result.move, result.score, result.pv))
+        assert found[0] == found[1], fen
+
+    # A frontier child that repeats a position is a draw in both
+    for engine in (plain, batched):
+        engine.load_fen('k7/8/8/8/8/8/8/K1Q5 w - - 0 1')
+        for move in [('c', 1, 'c', 2), ('a', 8, 'a', 7), ('c', 2, 'c', 1), ('a', 7, 'a', 8), ('c', 1, 'c', 2)]:
+            engine.make_move(*move)
+        engine._root_ply = engine.game_ply
+        assert engine.negamax(1, -float('inf'), float('inf')) == 0  # Ka7 repeats
+
+def test_perft_suite():
+    engine = ChessEngine(hash_mb=1)
+    for name, fen, expected in POSITIONS:
+        engine.load_fen(fen)
+        assert [engine.perft(depth) for depth in (1, 2, 3)] == expected[:3], name
+
+def test_quiescence():
+    engine = ChessEngine(hash_mb=1)
+    for name, fen, _ in POSITIONS:
+        engine.load_fen(fen)
+        moves = engine._legal_moves(engine.side)
+        noisy = [move for move in moves
+                 if engine.squares[move >> 6 & 63] or move & FLAG_MASK in (EN_PASSANT, PROMOTION)]
+        assert sorted(engine._legal_moves(engine.side, captures_only=True)) == sorted(noisy), name
+
+    # Qxd5 wins a pawn on a static count but loses the queen to exd5
+    engine.load_fen('4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1')
+    engine.quiescence = False
+    assert engine.choose_best_move('white', 1) == ('d', 1, 'd', 5)
+    engine.quiescence = True
+    assert engine.choose_best_move('white', 1) != ('d', 1, 'd', 5)
+    assert engine.qnodes > 0
+
+def test_selective_search():
+    nodes = []
+    for selective in (False, True):
+        engine = ChessEngine(hash_mb=1)
+        engine.null_move_pruning = engine.late_move_reductions = selective
+        assert engine.choose_best_move('white', 4) in engine.get_all_moves('white')
+        nodes.append(engine.nodes)
+    assert nodes[1] < nodes[0]
+
+    engine.load_fen("rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 3")
+    key = engine.hash_key
+    engine._make_null()
+    assert engine.side == 0 and engine.ep_square is None and engine.hash_key != key
+    engine.undo_move()
+    assert engine.side == 1 and engine.ep_square == 20 and engine.hash_key == key
+
+def test_principal_variation_search():
+    fen = "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"
+    engine = ChessEngine(hash_mb=1)
+    engine.load_fen(fen)
+    result = engine.search('white', 4)
+    assert result.depth == 4 and result.move == result.pv[0] and len(result.pv) == 4
+    assert result.nodes == engine.nodes and result.qnodes == engine.qnodes
+    for color, move in zip(['white', 'black'] * 2, result.pv):
+        assert move in engine.get_all_moves(color)
+        engine.make_move(*move)
+
+    # The White's-point-of-view wrapper is negamax with the sign flipped
+    scores = []
+    for maximizing in (True, False):
+        engine = ChessEngine(hash_mb=1)
+        engine.load_fen(fen.replace(' w ', ' b ') if not maximizing else fen)
+        scores.append(engine.minimax(3, -float('inf'), float('inf'), maximizing))
+        engine.tt.clear()
+        assert engine.negamax(3, -float('inf'), float('inf')) == scores[-1] * (1 if maximizing else -1)
+
+    engine = ChessEngine()
+    for move in [('f', 2, 'f', 3), ('e', 7, 'e', 5), ('g', 2, 'g', 4)]:
+        engine.make_move(*move)
+    result = engine.search('black', 3)
+    assert result.score > MATE_BOUND and result.pv == [('d', 8, 'h', 4)]
+
+def test_search_stats():
+    fen = POSITIONS[1][1]
+    engine = ChessEngine(hash_mb=4)
+    engine.load_fen(fen)
+    plain = engine.search('white', 3)
+
+    progress = []
+    engine = ChessEngine(hash_mb=4)
+    engine.load_fen(fen)
+    engine.stats = SearchStats(callback=lambda stats: progress.append(stats.total_nodes), every=500)
+    result = engine.search('white', 3)
+    stats = engine.stats
+    assert (result.move, result.nodes, result.qnodes) == (plain.move, plain.nodes, plain.qnodes)
+    assert 'negamax' not in engine.__dict__  # detached after the search
+    assert stats.qnodes == result.qnodes and len(stats.iteration_nodes) == 3
+    assert stats.total_nodes == stats.iteration_nodes[-1] == sum(stats.nodes) + stats.qnodes
+    assert progress == list(range(500, stats.total_nodes + 1, 500))
+    assert stats.nodes[1] and stats.cutoffs[1] and sum(stats.leaves) and stats.branching_factor() > 1
+    assert stats.movegen_calls and stats.eval_calls and stats.tt_probes >= stats.tt_hits > 0
+    assert 'branching factor' in stats.summary()
+
+    def fail(result):
+        raise RuntimeError
+    try:
+        engine.search('white', 3, report=fail)
+        assert False
+    except RuntimeError:
+        pass
+    assert 'negamax' not in engine.__dict__ and 'probe' not in engine.tt.__dict__  # detached anyway
+
+def test_self_play():
+    first, second = parse_config('depth=2'), parse_config('depth=1,quiescence=0')
+    assert second == {'depth': 1, 'quiescence': False}
+    fen = '6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1'
+    assert play_game(fen, first, second) == ('1-0', 'checkmate', ['Ra8#'])
+    result, termination, moves = play_game(START_FEN, first, second, {'max_plies': 6})
+    assert (result, termination, len(moves)) == ('1/2-1/2', 'move limit', 6)
+
+    lower, upper = sprt_bounds()
+    assert lower < 0 < upper
+    assert sprt_llr(60, 20, 20, 0, 10) > 0 > sprt_llr(20, 20, 60, 0, 10)
+    assert sprt_llr(30, 0, 0, 0, 10) == 0  # no spread yet
+
+    pgn = io.StringIO()
+    wins, draws, losses = run_match(first, second, 4, workers=2, adjudication={'max_plies': 8},
+                                    pgn=pgn, out=io.StringIO())
+    assert wins + draws + losses == 4
+    assert pgn.getvalue().count('[Event ') == 4 and '[FEN ' in pgn.getvalue()
+
+def test_draw_by_rule():
+    engine = ChessEngine()
+    shuffle = [('g', 1, 'f', 3), ('g', 8, 'f', 6), ('f', 3, 'g', 1), ('f', 6, 'g', 8)]
+    for move in shuffle * 2:
+        assert engine.is_draw() is None
+        engine.make_move(*move)
+    assert engine.halfmove == 8 and engine.is_draw() == 'threefold repetition'
+    engine.undo_move()
+    assert engine.halfmove == 7 and engine.is_draw() is None
+
+    # Inside the search a single repetition is already a draw
+    engine.load_fen(START_FEN)
+    for move in shuffle[:3]:
+        engine.make_move(*move)
+    engine._root_ply = engine.game_ply
+    engine.make_move(*shuffle[3])
+    engine.nodes = 0
+    assert engine.negamax(3, -float('inf'), float('inf')) == 0 and engine.nodes == 1
+
+    engine.load_fen('4k3/8/8/8/8/8/8/R3K3 w - - 99 80')
+    engine.make_move('a', 1, 'a', 2)
+    assert engine.is_draw() == 'fifty-move rule' and engine.to_fen().endswith(' 100 80')
+    engine.make_move('e', 8, 'd', 7)
+    assert engine.to_fen().endswith(' 101 81')
+
+    # A mate on the hundredth ply is still a mate, not a fifty-move draw
+    engine.load_fen('6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80')
+    engine._root_ply = engine.game_ply
+    engine.make_move('a', 1, 'a', 8)
+    assert engine.halfmove == 100 and engine.game_status('black') == 'checkmate'
+    assert engine.negamax(2, -float('inf'), float('inf')) < -MATE_BOUND
+
+def test_board_view():
+    engine = ChessEngine()
+    stale = engine.board
+    engine.make_move('e', 2, 'e', 4)
+    stale[0, 0] = 0  # a view of the position before e4 no longer writes back
+    assert engine.board[3, 4] == 1 and engine.board[0, 0] == 4 and engine.game_ply == 1
+    engine.board[1][3] = 0  # through a row
+    assert engine.board[1, 3] == 0 and engine.get_moves('d', 2) == []
+    snapshot = engine.board.copy()
+    snapshot[0, 1] = 0
+    assert engine.board[0, 1] == 2
+
+def test_position_cache():
+    engine = ChessEngine()
+    calls = []
+    generate = engine._legal_moves
+    engine._legal_moves = lambda side, captures_only=False: calls.append(side) or generate(side, captures_only)
+    assert engine.game_status('white') is None
+    assert len(engine.get_all_moves('white')) == 20 and not engine.is_checkmate('white')
+    assert sorted(engine.get_legal_moves('g', 1)) == [('f', 3), ('h', 3)]
+    assert calls == [0]  # one move generation for every query
+
+    for move in [('f', 2, 'f', 3), ('e', 7, 'e', 5), ('g', 2, 'g', 4)]:
+        engine.make_move(*move)
+    assert ('h', 4) in engine.get_legal_moves('d', 8) and not engine.is_in_check('white')
+    engine.make_move('d', 8, 'h', 4)
+    assert engine.is_in_check('white') and engine.game_status('white') == 'checkmate'
+    engine.undo_move()
+    assert not engine.is_checkmate('black') and engine.game_status('black') is None
+    assert calls == [0, 1, 0, 1]
+    engine.load_fen('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1')
+    assert engine.game_status('black') == 'stalemate'
+
+def test_castling_rights_follow_the_rooks():
+    engine = ChessEngine()
+    engine.load_fen("r3k2r/8/8/8/8/8/6b1/R3K2R b KQkq - 0 1")
+    engine.make_move('g', 2, 'h', 1)  # bishop takes the h1 rook
+    assert not engine.can_castle('white', 'kingside')
+    assert engine.can_castle('white', 'queenside')
+    engine.undo_move()
+    assert engine.can_castle('white', 'kingside') is False  # g2 bishop covers f1
+    assert sum(engine.divide(1).values()) == engine.perft(1)
+
+def test_search_cancel():
+    engine = ChessEngine()
+    stop = threading.Event()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(
+        engine.choose_best_move('white', time_limit=60, stop=stop)))
+    thread.start()
+    time.sleep(0.3)
+    start = time.time()
+    stop.set()
+    thread.join()
+    assert time.time() - start < 0.2
+    assert result[0] in engine.get_all_moves('white')
+    assert len(engine.move_history) == 0
+
+def test_parallel_search():
+    fen = "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQK2R b KQkq - 0 5"
+    engine = ChessEngine(hash_mb=1)
+    engine.load_fen(fen)
+    root_moves = engine._legal_moves(1)
+    # Called directly: search() caps the workers at the number of cores
+    found = [parallel.search_root(engine, root_moves, 3, workers)[:2] for workers in (2, 3, 2)]
+    assert found[0] == found[1] == found[2]
+    # Tables kept between root moves and a floor under the window: still a legal move
+    move, score = parallel.search_root(engine, root_moves, 3, 2, deterministic=False,
+                                       floor=found[0][1] + 1000)[:2]
+    assert move in root_moves  # every move failed low, so it was searched again without the floor
+    assert engine.choose_best_move('black', 3, workers=64) in engine.get_all_moves('black')
+    assert parallel._pool[0][0] == 2  # one pool at a time: the 3-worker pool was shut down
+    parallel.shutdown()
+
+    # Tasks carry a FEN and the moves since the last capture or pawn move
+    engine.load_fen(START_FEN)
+    for move in [('e', 2, 'e', 4), ('g', 8, 'f', 6), ('g', 1, 'f', 3), ('f', 6, 'g', 8), ('f', 3, 'g', 1),
+                 ('g', 8, 'f', 6)]:
+        engine.make_move(*move)
+    fen, moves = parallel._root_position(engine)
+    assert len(moves) == 5 and engine.game_ply == 6
+    worker = ChessEngine(hash_mb=1)
+    worker.load_fen(fen)
+    for move in moves:
+        worker._make(move)
+    assert worker.hash_key == engine.hash_key and worker._repetitions() == engine._repetitions() == 1
+
+def test_packed_moves():
+    engine = ChessEngine()
+    engine.load_fen("r3k2r/1P6/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    moves = engine._legal_moves(0)
+    assert encode_move(4, 6, CASTLING) in moves
+    assert encode_move(49, 56, QUEEN_PROMOTION) in moves  # bxa8=Q
+    engine.make_move('b', 7, 'a', 8)
+    assert engine.squares[56] == 5
+    assert engine.castling == 0b0111  # the a8 rook took black's queenside right along
+    assert engine.move_history == [('b', 7, 'a', 8)]
+    engine.undo_move()
+    assert engine.castling == 0b1111 and engine.squares[49] == 1
+    assert engine.move_history == []
+
+BOOK_PGN = """[Event "Book test"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 {the main line} Nc6 (2... d6 3. d4) 3. Bb5 a6 4. Ba4 Nf6 5. O-O 1-0
+
+[Event "Book test"]
+[Result "1/2-1/2"]
+
+1. e4 c5 2. Nf3 d6 $1 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 a6 1/2-1/2
+
+[Event "Book test"]
+[Result "0-1"]
+
+1. d4 d5 2. c4 e6 0-1
+"""
+
+def test_opening_book():
+    engine = ChessEngine()
+    assert parse_san(engine, 'Nf3') == encode_move(6, 21)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'book.bin')
+        assert build_book(BOOK_PGN, path, max_plies=20) == 22  # every move read
+        book = OpeningBook(path, seed=1)
+        start = sorted((move_name(move), weight) for move, weight in book.probe(engine.hash_key))
+        assert start == [(('d', 2, 'd', 4), 1), (('e', 2, 'e', 4), 2)]
+        assert book.probe(12345) == []
+
+        engine.book = book
+        engine.make_move('e', 2, 'e', 4)
+        assert engine.choose_best_move('black', 3) in [('e', 7, 'e', 5), ('c', 7, 'c', 5)]
+        engine.make_move('a', 7, 'a', 6)  # out of book: searched as usual
+        assert engine.choose_best_move('white', 1) in engine.get_all_moves('white')
+        book.close()
+
+def test_tablebase():
+    with tempfile.TemporaryDirectory() as tmp:
+        table = generate('KQvK')
+        assert max(table.values) == 20  # longest KQ v K mate: 19 plies
+        save_table(table, tmp)
+        tablebases = Tablebases(tmp)
+        assert tablebases.max_pieces == 3
+
+        engine = ChessEngine()
+        engine.tablebases = tablebases
+        engine.load_fen('7k/8/6K1/8/8/8/8/1Q6 w - - 0 1')
+        assert tablebases.probe(engine) == 2  # mate in one ply
+        assert engine.choose_best_move('white', 1) == ('b', 1, 'b', 8)
+        engine.load_fen('1q6/8/8/8/8/6k1/8/7K b - - 0 1')  # colours swapped
+        assert tablebases.probe(engine) == 2
+        assert engine.minimax(2, -float('inf'), float('inf'), False) < -999000
+        engine.load_fen('8/8/8/3k4/8/8/8/R3K3 w - - 0 1')
+        assert tablebases.probe(engine) is None  # no KR v K table
+
+        # Copies share the mapped tables instead of opening the files again
+        assert copy.deepcopy(engine).tablebases is tablebases
+        assert pickle.loads(pickle.dumps(tablebases)) is tablebases
+
+def test_fen_and_epd():
+    fen = "r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 12"
+    engine = ChessEngine()
+    engine.load_fen(fen)
+    assert engine.to_fen() == fen
+    engine.make_move('e', 5, 'd', 6)
+    assert engine.to_fen() == "r3k2r/1P6/3P4/8/8/8/8/R3K2R b KQkq - 0 12"
+    engine.make_move('e', 8, 'c', 8)
+    assert engine.to_fen().endswith(" w KQ - 1 13")
+    for bad in ('8/8/8/8/8/8/8/K6k w - e 0 1', '8/8/8/8/8/8/8/K6k w - e9 0 1'):
+        try:
+            engine.load_fen(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+    engine.load_fen(fen)
+    for move, san in [(encode_move(36, 43, EN_PASSANT), 'exd6'), (encode_move(4, 6, CASTLING), 'O-O'),
+                      (encode_move(49, 57, QUEEN_PROMOTION), 'b8=Q+'), (encode_move(0, 3), 'Rd1')]:
+        assert move_to_san(engine, move) == san
+        assert parse_san(engine, san) == move
+
+    record = '6k1/5ppp/8/8/8/8/8/R5K1 w - - id "back; rank"; bm Ra8#;'
+    position, operations = parse_epd(record)
+    assert position == '6k1/5ppp/8/8/8/8/8/R5K1 w - -'
+    assert operations == {'id': '"back; rank"', 'bm': 'Ra8#'}
+    assert format_epd(position, operations) == record
+
+def test_batch_analysis():
+    lines = ['6k1/5ppp/8/8/8/8/8/R5K1 w - - id "mate";', '', 'not a position',
+             '8/8/8/8/8/8/8/K6k w - e9;', '8/8/8/8/8/8/8/K6k w - e;',
+             '7k/5Q2/6K1/8/8/8/8/8 b - - id "stalemate";',
+             'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - bm Bb5;']
+    for workers in (1, 2):
+        results = list(analyze_stream(iter(lines), depth=2, workers=workers, chunk_size=2))
+        assert [error is None for _, error in results] == [True, False, False, False, True, True]
+        mate, _, _, _, stalemate, opening = (parse_epd(record)[1] if record else None
+                                             for record, _ in results)
+        assert mate['bm'] == 'Ra8#' and mate['dm'] == '1' and mate['id'] == '"mate"'
+        assert stalemate == {'id': '"stalemate"'}
+        assert opening['acd'] == '2' and opening['pv'].split()[0] == opening['bm']
+
+def test_ponder_hit():
+    gui = ChessGUI.__new__(ChessGUI)  # no window: only the search state is used
+    gui.engine = ChessEngine(hash_mb=1)
+    gui.ai_ponder, gui.game_over = True, False
+    gui.ai_depth, gui.ai_time, gui._ai_reached = None, 3.0, None
+    gui.ponder()
+    time.sleep(0.2)
+    assert gui.stop_ponder() is None and gui._ponder_result.depth >= 1
+
+    e4, e5 = ('e', 2, 'e', 4), ('e', 7, 'e', 5)
+    def hit(depth, played=e4):
+        gui._ponder_stop, gui._ponder_thread = threading.Event(), threading.Thread(target=lambda: None)
+        gui._ponder_thread.start()
+        gui._ponder_result = SearchResult(e4, 0, depth, (e4, e5))
+        return gui.stop_ponder(played)
+    assert hit(9) is None  # no timed search yet to compare with
+    gui._ai_reached = 5
+    assert hit(5) is None and hit(6) == e5  # the reply is searched one ply less deep
+    assert hit(6, ('d', 2, 'd', 4)) is None
+    gui.ai_depth, gui.ai_time = 2, None
+    assert hit(3) == e5 and hit(2) is None
+
+def test_uci():
+    out = io.StringIO()
+    uci = UCIEngine(out)
+    for line in ['uci', 'setoption name Hash value 4', 'position startpos moves e2e4 e7e5 g1f3',
+                 'go depth 3']:
+        assert uci.handle(line)
+    uci.wait()
+    lines = out.getvalue().splitlines()
+    assert 'uciok' in lines
+    assert [line.split()[2] for line in lines if line.startswith('info depth')] == ['1', '2', '3']
+    assert lines[-1].startswith('bestmove ')
+    assert parse_uci(uci.engine, lines[-1].split()[1])  # a legal reply for black
+    assert move_to_uci(parse_uci(uci.engine, 'b8c6')) == 'b8c6'
+
+    out.truncate(0)
+    uci.handle('position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+    uci.handle('go infinite')
+    time.sleep(0.2)
+    uci.handle('isready')
+    assert 'readyok' in out.getvalue() and 'bestmove' not in out.getvalue()  # infinite waits for stop
+    uci.handle('stop')
+    assert 'score mate 1' in out.getvalue() and out.getvalue().endswith('bestmove a1a8\n')
+
+    # Malformed input from the GUI is reported, not fatal
+    out.truncate(0)
+    out.seek(0)
+    for line in ['position fen 8/8/8/8/8/8/8/K6k w - e 0 1', 'position fen 8/8/8/8/8/8/8/K6k w - e9 0 1']:
+        assert uci.handle(line)
+    assert out.getvalue().count('info string Invalid FEN en passant square') == 2
+    assert not uci.handle('quit')
+
 def run_all_tests():
 #    test_initial_board()
 #    test_pawn_moves()